@@ -0,0 +1,441 @@
+import argparse
+import json
+import os
+import itertools
+import random
+import re
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from clean_tweets_dataframe import SPAM_AUTHORS, CleanTweets, parse_created_at
+from search_index import SearchIndex
+from word_freq import build_word_counts, word_frequencies
+from extract_dataframe import TweetDfExtractor, clean_text_series, extract_batches_incremental, typed_tweet_df
+from hydrate import HydrationCheckpoint, TweetHydrator
+from mock_twitter_api import MockTweetAPI
+from near_duplicates import near_duplicate_clusters
+from tweet_store import PartitionedTweetStore
+from plotly_dashboard.controls import AUTHOR_BLOCKLIST
+
+pd.options.mode.chained_assignment = None
+
+
+def make_synthetic_tweets(n_tweets: int, seed: int = 0) -> list:
+    """
+    build a synthetic corpus of flattened (twarc v2) tweets shaped like the ones read_json returns
+    Args:
+    -----
+    n_tweets: int - number of tweets to generate
+    seed: int - random seed so two runs build the same corpus
+
+    Returns
+    -------
+    A list of tweet dicts
+    """
+    rand = random.Random(seed)
+    langs = ['en', 'fr', 'in', 'tl', 'ht', 'de']
+    words = ['Rwanda', 'Congo', 'peace', 'war', 'good', 'bad', 'great', 'news', 'today', 'people']
+    tweets = []
+    for i in range(n_tweets):
+        author = {'username': 'user_{}'.format(rand.randrange(5000)),
+                  'location': rand.choice(['Kigali', 'Goma', 'Kinshasa', 'Paris']),
+                  'public_metrics': {'followers_count': rand.randrange(10 ** 6),
+                                     'following_count': rand.randrange(5000)}}
+        tags = [{'tag': rand.choice(words)} for _ in range(rand.randrange(3))]
+        tweet = {'id': 10 ** 18 + i, 'created_at': '2022-07-{:02d}T10:00:00.000Z'.format(rand.randrange(1, 29)),
+                 'source': 'Twitter for Android', 'lang': rand.choice(langs), 'author': author,
+                 'text': 'RT @{} #{} {} https://t.co/x'.format(author['username'], rand.choice(words),
+                                                               ' '.join(rand.sample(words, 5))),
+                 'public_metrics': {'like_count': rand.randrange(100), 'reply_count': rand.randrange(10),
+                                    'retweet_count': rand.randrange(50)},
+                 'entities': {'hashtags': tags, 'mentions': [{'username': author['username']}]},
+                 'possibly_sensitive': False}
+        kind = rand.random()
+        if kind < 0.5:
+            tweet['referenced_tweets'] = [{'text': tweet['text'], 'entities': {'hashtags': tags}}]
+            if kind < 0.1:
+                tweet['in_reply_to_user'] = {'username': 'someone'}
+        tweets.append(tweet)
+    return tweets
+
+
+def to_v1_tweet(tweet: dict) -> dict:
+    """the api v1.1 payload of a make_synthetic_tweets tweet, with the same content"""
+    author = tweet['author']
+    created_at = pd.Timestamp(tweet['created_at']).strftime('%a %b %d %H:%M:%S +0000 %Y')
+    v1_tweet = {'id': tweet['id'], 'created_at': created_at, 'source': tweet['source'], 'lang': tweet['lang'],
+                'full_text': tweet['text'], 'favorite_count': tweet['public_metrics']['like_count'],
+                'reply_count': tweet['public_metrics']['reply_count'],
+                'retweet_count': tweet['public_metrics']['retweet_count'],
+                'user': {'screen_name': author['username'], 'location': author['location'],
+                         'followers_count': author['public_metrics']['followers_count'],
+                         'friends_count': author['public_metrics']['following_count']},
+                'entities': {'hashtags': [{'text': tag['tag']} for tag in tweet['entities']['hashtags']],
+                             'user_mentions': [{'screen_name': mention['username']}
+                                               for mention in tweet['entities']['mentions']]},
+                'possibly_sensitive': tweet['possibly_sensitive'], 'in_reply_to_status_id': None}
+    if 'referenced_tweets' in tweet:
+        referenced = tweet['referenced_tweets'][0]
+        if 'in_reply_to_user' in tweet:
+            v1_tweet['in_reply_to_status_id'] = 1
+        v1_tweet['retweeted_status'] = {'full_text': referenced['text'], 'entities': {
+            'hashtags': [{'text': tag['tag']} for tag in referenced['entities']['hashtags']]}}
+    return v1_tweet
+
+
+def legacy_per_method_columns(tweets: list) -> dict:
+    """
+    the raw columns of get_tweet_df built like the original TweetDfExtractor did, frozen here as the
+    reference of the single pass extractor: one walk over the tweets per find_*/get_* method, with
+    a KeyError fallback for every missing field
+    """
+    def walk(read, missing=np.nan):
+        values = []
+        for tweet in tweets:
+            try:
+                values.append(read(tweet))
+            except KeyError:
+                values.append(missing)
+        return values
+
+    def full_text(tweet):
+        if 'text' in tweet.keys():
+            return str(tweet['text']).strip()
+        if 'referenced_tweets' in tweet.keys() and 'in_reply_to_user' not in tweet.keys():
+            return str(tweet['referenced_tweets'][0]['text']).strip()
+        return np.nan
+
+    def entity_list(key, item_key):
+        def read(tweet):
+            if 'entities' in tweet.keys() and key in tweet['entities'].keys():
+                return ", ".join([item[item_key] for item in tweet['entities'][key]])
+            return np.nan
+        return read
+
+    def retweet_hashtags(tweet):
+        if 'referenced_tweets' not in tweet.keys():
+            return np.nan
+        try:
+            return ", ".join([hashtag['tag'] for hashtag in tweet['referenced_tweets'][0]['entities']['hashtags']])
+        except Exception:
+            return np.nan
+
+    def tweet_category(tweet):
+        if 'in_reply_to_user' in tweet and 'referenced_tweets' in tweet:
+            return 'Reply'
+        if 'referenced_tweets' in tweet and 'in_reply_to_user' not in tweet:
+            return 'Retweet'
+        return 'Tweet'
+
+    return {'created_at': [tweet['created_at'] for tweet in tweets], 'source': [tweet['source'] for tweet in tweets],
+            'original_text': walk(full_text), 'lang': walk(lambda tweet: tweet['lang']),
+            'likes_count': walk(lambda tweet: tweet['public_metrics']['like_count'], 0),
+            'reply_count': walk(lambda tweet: tweet['public_metrics']['reply_count'], 0),
+            'retweet_count': walk(lambda tweet: tweet['public_metrics']['retweet_count'], 0),
+            'original_author': walk(lambda tweet: tweet['author']['username']),
+            'followers_count': walk(lambda tweet: tweet['author']['public_metrics']['followers_count']),
+            'friends_count': walk(lambda tweet: tweet['author']['public_metrics']['following_count']),
+            'possibly_sensitive': [tweet['possibly_sensitive'] if 'possibly_sensitive' in tweet.keys() else None
+                                   for tweet in tweets],
+            'hashtags': walk(entity_list('hashtags', 'tag')), 'retweet_hashtags': walk(retweet_hashtags),
+            'user_mentions': walk(entity_list('mentions', 'username')),
+            'place': walk(lambda tweet: tweet['author']['location']), 'tweet_url': walk(
+                lambda tweet: "https://twitter.com/{}/status/{}".format(tweet['author']['username'], tweet['id'])),
+            'tweet_id': walk(lambda tweet: str(tweet['id'])), 'tweet_category': walk(tweet_category)}
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def bench_extraction(n_tweets: int):
+    tweets = make_synthetic_tweets(n_tweets)
+    tweety = TweetDfExtractor(tweets)
+
+    per_method, per_method_time = timed(legacy_per_method_columns, tweets)
+    single_pass, single_pass_time = timed(tweety.extract_columns)
+
+    # np.nan != np.nan, so compare with repr to treat missing values as equal
+    same = all(list(map(repr, per_method[col])) == list(map(repr, single_pass[col])) for col in per_method)
+    print('column extraction on {:,} tweets'.format(n_tweets))
+    print('  per-method : {:8.2f}s'.format(per_method_time))
+    print('  single-pass: {:8.2f}s  ({:.1f}x)'.format(single_pass_time, per_method_time / single_pass_time))
+    print('  identical output: {}'.format(same))
+
+    v1_tweety = TweetDfExtractor([to_v1_tweet(tweet) for tweet in tweets])
+    v1_columns, v1_time = timed(v1_tweety.extract_columns)
+    v1_columns['created_at'] = single_pass['created_at']
+    same = all(list(map(repr, single_pass[col])) == list(map(repr, v1_columns[col])) for col in single_pass)
+    print('  v1.1 payload ({}): {:8.2f}s  same columns as v2: {}'.format(v1_tweety.schema, v1_time, same))
+
+    object_df = pd.DataFrame.from_dict(single_pass, orient='index').transpose()
+    typed_df = typed_tweet_df(single_pass)
+    print('  object frame: {:8.1f} MB'.format(object_df.memory_usage(deep=True).sum() / 1e6))
+    print('  typed frame : {:8.1f} MB'.format(typed_df.memory_usage(deep=True).sum() / 1e6))
+
+
+def bench_sentiment(n_tweets: int):
+    tweets = make_synthetic_tweets(n_tweets)
+    tweety = TweetDfExtractor(tweets)
+    tweety.build_tweet_df()
+    text_new = tweety.text_cleaner(tweety.find_full_text())
+
+    def scored_twice():
+        # what get_tweet_df used to do: one pass for polarity/subjectivity, another for the classes
+        tweety.find_sentiments(text_new)
+        tweety.find_sentiments(text_new)
+
+    _, twice_time = timed(scored_twice)
+    print('build_tweet_df stages on {:,} tweets'.format(n_tweets))
+    for stage, seconds in tweety.stage_times.items():
+        print('  {:<13}: {:8.2f}s'.format(stage, seconds))
+    print('  sentiment scored twice (old path): {:.2f}s'.format(twice_time))
+
+
+def bench_sentiment_pool(n_tweets: int):
+    tweets = make_synthetic_tweets(n_tweets)
+    workers = os.cpu_count() or 1
+    serial = TweetDfExtractor(tweets)
+    pooled = TweetDfExtractor(tweets, sentiment_workers=workers, sentiment_chunksize=500)
+    text_new = serial.text_cleaner(serial.find_full_text())
+
+    serial_scores, serial_time = timed(serial.find_sentiments, text_new)
+    pooled_scores, pooled_time = timed(pooled.find_sentiments, text_new)
+    print('sentiment scoring on {:,} tweets'.format(n_tweets))
+    print('  serial    : {:8.2f}s'.format(serial_time))
+    print('  {:>2} workers: {:8.2f}s  ({:.1f}x)'.format(workers, pooled_time, serial_time / pooled_time))
+    print('  identical output: {}'.format(serial_scores == pooled_scores))
+
+
+def legacy_text_cleaner(text: list) -> list:
+    """the original text_cleaner: six uncompiled re.sub passes per tweet"""
+    clean_text = []
+    for tweet_text in text:
+        tweet_text = re.sub("^RT ", "", tweet_text)
+        tweet_text = re.sub("@[A-Za-z0-9:_]+", "", tweet_text)
+        tweet_text = re.sub("#[A-Za-z0-9_]+", "", tweet_text)
+        tweet_text = re.sub(r"http\S+", "", tweet_text)
+        tweet_text = re.sub(r"www.\S+", "", tweet_text)
+        tweet_text = re.sub("^ ", "", tweet_text)
+        clean_text.append(tweet_text)
+    return clean_text
+
+
+def golden_texts() -> list:
+    """every string of the frugumire.json sample plus edge cases where passes interact"""
+    def strings(value):
+        if isinstance(value, str):
+            yield value
+        elif isinstance(value, dict):
+            for item in value.values():
+                yield from strings(item)
+        elif isinstance(value, list):
+            for item in value:
+                yield from strings(item)
+
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'frugumire.json'), 'r') as sample:
+        texts = list(strings(json.load(sample)))
+    return texts + ['RT @a: hi', ' @a #b http://x', 'http@a b', 'www@a', 'www @a b', 'wwwhttp://x y',
+                    'www.http://x', '#ab@c.d', '#@a b', 'RT RT @x', '', ' ', 'x www.y.com http:/']
+
+
+def bench_text_cleaner(n_tweets: int):
+    tweety = TweetDfExtractor([])
+    golden = golden_texts()
+    print('golden output identical: {}'.format(
+        legacy_text_cleaner(golden) == tweety.text_cleaner(golden) == clean_text_series(pd.Series(golden)).tolist()))
+
+    text = [tweet['text'] for tweet in make_synthetic_tweets(n_tweets)]
+    legacy, legacy_time = timed(legacy_text_cleaner, text)
+    compiled, compiled_time = timed(tweety.text_cleaner, text)
+    batch, batch_time = timed(clean_text_series, pd.Series(text))
+    print('text cleaning on {:,} tweets'.format(n_tweets))
+    print('  six re.sub    : {:12,.0f} tweets/s'.format(n_tweets / legacy_time))
+    print('  precompiled   : {:12,.0f} tweets/s'.format(n_tweets / compiled_time))
+    print('  series batch  : {:12,.0f} tweets/s'.format(n_tweets / batch_time))
+    print('  identical output: {}'.format(legacy == compiled == batch.tolist()))
+
+
+def legacy_cleaning_chain(df: pd.DataFrame) -> pd.DataFrame:
+    """the original CleanTweets steps and the dashboard blocklist: one pass per replace/mask"""
+    df = df.drop_duplicates(subset=['original_text', 'original_author'])
+    for author in SPAM_AUTHORS:
+        df = df[df.original_author != author]
+    df['lang'] = df['lang'].replace('in', value='kiny')
+    df['lang'] = df['lang'].replace('tl', value='kiny')
+    df['lang'] = df['lang'].replace('ht', value='kiny')
+    df = df.query("lang == 'en' | lang =='fr' | lang == 'kiny' ")
+    df['place'] = df['place'].str.lower()
+    df['place'] = df['place'].replace(r'^.*xico.*', value='Mexico', regex=True)
+    df['place'] = df['place'].replace(r'(^.*[kK]igali.*)|(^.*wanda.*)', value='Rwanda', regex=True)
+    df['place'] = df['place'].replace(r'(^.*[Kk]inshasa.*)|(.*congo.*)|(.*drc.*)|(.*rdc.*)|(.*démocratique du.*)',
+                                      value='DRC Congo', regex=True)
+    df['place'] = df['place'].replace('bukavu', 'DR Congo', regex=True)
+    df['place'] = df['place'].replace('goma', 'DR Congo', regex=True)
+    for author in AUTHOR_BLOCKLIST:
+        df = df[df.original_author != author]
+    return df
+
+
+def cleaning_plan(df: pd.DataFrame) -> pd.DataFrame:
+    cleaner = CleanTweets(df, author_blocklist=SPAM_AUTHORS + AUTHOR_BLOCKLIST)
+    return cleaner.run(steps=['drop_retweets', 'remove_other_languages_tweets', 'treat_special_characters'])
+
+
+def bench_cleaning(n_tweets: int):
+    sample = pd.read_parquet('processed_tweet_data.parquet')
+    sample['lang'] = sample['lang'].astype(object)
+    # repeat the sample, numbering the texts so drop_duplicates keeps the copies
+    df = pd.concat([sample.assign(original_text=sample['original_text'] + ' ' + str(i))
+                    for i in range(-(-n_tweets // len(sample)))], ignore_index=True).head(n_tweets)
+
+    legacy, legacy_time = timed(legacy_cleaning_chain, df.copy())
+    planned, plan_time = timed(cleaning_plan, df.copy())
+    print('CleanTweets drop_retweets/languages/places + blocklist on {:,} tweets'.format(len(df)))
+    print('  per-pass chain : {:8.2f}s'.format(legacy_time))
+    print('  vectorised plan: {:8.2f}s  ({:.1f}x)'.format(plan_time, legacy_time / plan_time))
+    print('  identical output: {}'.format(legacy.equals(planned)))
+
+
+def bench_created_at(n_tweets: int):
+    rand = random.Random(0)
+    stamps = pd.Timestamp('2022-07-01', tz='UTC') + pd.to_timedelta(
+        [rand.randrange(30 * 24 * 3600) for _ in range(n_tweets)], unit='s')
+    layouts = {'v1.1': stamps.strftime('%a %b %d %H:%M:%S +0000 %Y').tolist(),
+               'v2': stamps.strftime('%Y-%m-%dT%H:%M:%S.000Z').tolist()}
+    print('created_at parsing on {:,} tweets'.format(n_tweets))
+    for layout, created_at in layouts.items():
+        inferred, inferred_time = timed(lambda values: pd.to_datetime(values, errors='coerce'), created_at)
+        parsed, parsed_time = timed(parse_created_at, created_at)
+        print('  {:<4} inferred: {:8.2f}s  explicit: {:6.2f}s  ({:.1f}x)  identical output: {}'.format(
+            layout, inferred_time, parsed_time, inferred_time / parsed_time,
+            (pd.DatetimeIndex(inferred) == pd.DatetimeIndex(parsed)).all()))
+
+
+def bench_search(n_tweets: int):
+    df = pd.DataFrame(TweetDfExtractor(make_synthetic_tweets(n_tweets)).extract_columns())
+    # the synthetic texts only use 10 words, add one from a large vocabulary so queries can be selective
+    rand = random.Random(0)
+    df['original_text'] = df['original_text'] + [' w{}'.format(rand.randrange(50000)) for _ in range(len(df))]
+    df['cleaned_text'] = clean_text_series(df['original_text'])
+    index = SearchIndex()
+    _, build_time = timed(index.add, df)
+    print('full text search on {:,} tweets (index built in {:.2f}s)'.format(n_tweets, build_time))
+    for query in ['w123', 'w123 peace', '"peace w42"', 'peace']:
+        words = [word.strip('"').lower() for word in query.split()]
+        if query.startswith('"'):
+            words = [query.strip('"').lower()]
+
+        def substring_scan():
+            mask = pd.Series(True, index=df.index)
+            for word in words:
+                mask &= df['cleaned_text'].str.lower().str.contains(word, regex=False)
+            return mask
+
+        scanned, scan_time = timed(substring_scan)
+        found, search_time = timed(index.search, query)
+        print('  {:<14} substring scan: {:8.3f}s  index: {:8.4f}s  ({:,} matches, scan {:,})'.format(
+            query, scan_time, search_time, len(found), int(scanned.sum())))
+
+
+def bench_words(n_tweets: int):
+    df = pd.DataFrame(TweetDfExtractor(make_synthetic_tweets(n_tweets)).extract_columns())
+    # like bench_search, with a large vocabulary of letter only words
+    rand = random.Random(0)
+    vocabulary = [''.join(rand.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(6)) for _ in range(50000)]
+    df['original_text'] = df['original_text'] + [' ' + rand.choice(vocabulary) for _ in range(len(df))]
+    df['cleaned_text'] = clean_text_series(df['original_text'])
+    df['sentiment'] = [rand.choice(['Positive', 'Negative', 'Neutral']) for _ in range(len(df))]
+    counts, build_time = timed(build_word_counts, df)
+    print('word counts of {:,} tweets built in {:.2f}s ({:,} rows)'.format(n_tweets, build_time, len(counts)))
+    for sent_sel, lang_sel in [(None, None), (['Positive'], None), (['Negative', 'Neutral'], ['en'])]:
+        def rescan():
+            df_sel = df[df['sentiment'].isin(sent_sel or df['sentiment'].unique()) &
+                        df['lang'].isin(lang_sel or df['lang'].unique())]
+            return build_word_counts(df_sel)
+
+        _, scan_time = timed(rescan)
+        frequencies, select_time = timed(word_frequencies, counts, sent_sel, lang_sel)
+        print('  {!s:<24} {!s:<8} rescan: {:7.3f}s  counts: {:7.4f}s  ({} words)'.format(
+            sent_sel, lang_sel, scan_time, select_time, len(frequencies)))
+
+
+def bench_near_duplicates(n_tweets: int):
+    rand = random.Random(0)
+    vocabulary = [''.join(rand.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rand.randrange(3, 9)))
+                  for _ in range(20000)]
+    texts = [' '.join(rand.choices(vocabulary, k=rand.randrange(15, 30))) for _ in range(n_tweets)]
+    # copy-pasta: 1% of the tweets are variants of 20 campaign texts, with one word changed
+    for i in range(n_tweets // 100):
+        words = texts[i % 20].split()
+        words[rand.randrange(len(words))] = rand.choice(vocabulary)
+        texts[rand.randrange(20, n_tweets)] = ' '.join(words) + rand.choice(['', ' !', ' #RDF'])
+    texts = pd.Series(texts)
+
+    exact, exact_time = timed(lambda: texts.duplicated().sum())
+    clusters, lsh_time = timed(near_duplicate_clusters, texts)
+    sizes = pd.Series(clusters).value_counts()
+    print('near duplicates of {:,} tweets (20 campaigns of {:,} variants)'.format(n_tweets, n_tweets // 100 // 20 + 1))
+    print('  exact duplicates   : {:8.2f}s  {:,} dropped'.format(exact_time, exact))
+    print('  minhash/lsh (0.8)  : {:8.2f}s  {:,} dropped, largest clusters {}'.format(
+        lsh_time, len(texts) - len(sizes), sizes.head(20).tolist()))
+
+
+def bench_hydration(n_tweets: int):
+    tweets = make_synthetic_tweets(n_tweets)
+    # 2% of the ids are deleted tweets the api does not find
+    ids = [str(tweet['id']) for tweet in tweets] + [str(2 * 10 ** 18 + i) for i in range(n_tweets // 50)]
+    random.Random(0).shuffle(ids)
+    print('hydration of {:,} ids from a local mock api (50ms per request)'.format(len(ids)))
+    server = MockTweetAPI(tweets, limit=10 ** 9, latency=0.05, error_rate=0.01)
+    url = server.start()
+    base_time = None
+    for concurrency in [1, 4, 16]:
+        hydrator = TweetHydrator('token', api_url=url, concurrency=concurrency)
+        hydrator.backoff = lambda attempt: 0.01 * attempt ** 2
+        n_found, run_time = timed(lambda: sum(len(batch) for batch in hydrator.iter_batches(ids)))
+        base_time = base_time or run_time
+        print('  concurrency {:>2}: {:8.2f}s ({:.1f}x)  {:,} requests, {:,} tweets'.format(
+            concurrency, run_time, base_time / run_time, hydrator.requests, n_found))
+    server.stop()
+
+    # rate limited run into a store, stopped after 2 batches and resumed from its checkpoint
+    ids = ids[:20000]
+    server = MockTweetAPI(tweets, limit=40, window=2, latency=0.01)
+    url = server.start()
+    with tempfile.TemporaryDirectory() as store_dir:
+        store = PartitionedTweetStore(store_dir)
+        checkpoint = HydrationCheckpoint(os.path.join(store_dir, 'hydrate_checkpoint.sqlite'))
+        hydrator = TweetHydrator('token', api_url=url, concurrency=8, checkpoint=checkpoint)
+        n_first = extract_batches_incremental(itertools.islice(hydrator.iter_batches(ids), 2), store)
+        first_requests, first_done = hydrator.requests, len(checkpoint)
+        n_resumed, resume_time = timed(lambda: extract_batches_incremental(hydrator.iter_batches(ids), store))
+        expected = len(set(ids) & set(server.payloads))
+        print('  interrupted run: {:,} tweets stored, {} requests ({} of {} done)'.format(
+            n_first, first_requests, first_done, -(-len(ids) // 100)))
+        print('  resumed run    : {:,} tweets stored in {:.2f}s, {} requests, {} rate limited (429)'.format(
+            n_resumed, resume_time, hydrator.requests, server.rate_limited))
+        print('  complete: {}  (stored {:,}, expected {:,})'.format(len(store) == expected, len(store), expected))
+        checkpoint.close()
+        store.close()
+    server.stop()
+
+
+BENCHMARKS = {'extraction': bench_extraction, 'sentiment': bench_sentiment, 'sentiment_pool': bench_sentiment_pool,
+              'text_cleaner': bench_text_cleaner, 'cleaning': bench_cleaning, 'created_at': bench_created_at,
+              'search': bench_search, 'words': bench_words,
+              'hydration': bench_hydration, 'near_duplicates': bench_near_duplicates}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='benchmarks for the tweet extraction pipeline')
+    parser.add_argument('benchmark', nargs='?', choices=BENCHMARKS, default='extraction')
+    parser.add_argument('-n', '--n-tweets', type=int, default=1_000_000, help='size of the synthetic corpus')
+    args = parser.parse_args()
+
+    BENCHMARKS[args.benchmark](args.n_tweets)
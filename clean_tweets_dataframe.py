@@ -1,97 +1,294 @@
+import re
+
+import numpy as np
 import pandas as pd
 import string
 
+from near_duplicates import near_duplicate_clusters
+from profiler import stage
+
+# twitter tags many kinyarwanda tweets with these language codes
+LANG_ALIASES = {'in': 'kiny', 'tl': 'kiny', 'ht': 'kiny'}
+KEEP_LANGS = ['en', 'fr', 'kiny']
+
+# spam accounts dropped together with the retweets
+SPAM_AUTHORS = ['RepDeFiFidonia', 'republikaonline']
+
+# place normalisation, applied in this order to the lower cased place
+PLACE_PATTERNS = [
+    (re.compile(r'^.*xico.*'), 'Mexico'),
+    (re.compile(r'(^.*[kK]igali.*)|(^.*wanda.*)'), 'Rwanda'),
+    (re.compile(r'(^.*[Kk]inshasa.*)|(.*congo.*)|(.*drc.*)|(.*rdc.*)|(.*démocratique du.*)'), 'DRC Congo'),
+    (re.compile('bukavu'), 'DR Congo'),
+    (re.compile('goma'), 'DR Congo'),
+]
+
+
+def normalise_place(place: str) -> str:
+    """
+    one lower cased place through every PLACE_PATTERNS replacement
+    """
+    for pattern, value in PLACE_PATTERNS:
+        place = pattern.sub(value, place)
+    return place
+
+# created_at of twitter api v1.1 ("Sun Jul 17 21:58:09 +0000 2022"), v2 uses ISO 8601 which pandas
+# already parses on a fast path. strptime on the v1.1 layout is slow, so it is rewritten to ISO_FORMAT
+V1_CREATED_AT_RE = re.compile(r'^[A-Z][a-z]{2} [A-Z][a-z]{2} \d{2} \d{2}:\d{2}:\d{2} [+-]\d{4} \d{4}$')
+ISO_FORMAT = '%Y-%m-%dT%H:%M:%S%z'
+MONTHS = {month: '{:02d}'.format(i + 1) for i, month in
+          enumerate(['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'])}
+
+
+def v1_to_iso(created_at: str) -> str:
+    """
+    rewrite a v1.1 created_at ('Sun Jul 17 21:58:09 +0000 2022') as ISO_FORMAT ('2022-07-17T21:58:09+0000')
+    by slicing its fixed width fields, which is far cheaper than strptime on the original layout
+    """
+    return '{}-{}-{}T{}{}'.format(created_at[26:30], MONTHS.get(created_at[4:7], '??'), created_at[8:10],
+                                  created_at[11:19], created_at[20:25])
+
+
+def parse_created_at(created_at) -> pd.Series:
+    """
+    parse created_at strings to UTC datetime64. The layout (v1.1 or v2) is detected from the first
+    value. v1.1 batches are parsed one distinct value at a time, rewritten to ISO_FORMAT and parsed with
+    that explicit format, v2 ones go straight to pandas' ISO 8601 parser (which has its own cache of
+    repeated values). Values in another layout fall back to format inference, the ones it cannot parse
+    either become NaT.
+
+    Args:
+    -----
+    created_at: list or Series of created_at strings
+
+    Returns
+    -------
+    A Series of datetime64[ns, UTC], with the index of created_at when it is a Series
+    """
+    created_at = created_at if isinstance(created_at, pd.Series) else pd.Series(created_at, dtype=object)
+    first = created_at.loc[created_at.first_valid_index()] if created_at.notna().any() else None
+    if not (isinstance(first, str) and V1_CREATED_AT_RE.match(first)):
+        return pd.to_datetime(created_at, errors='coerce', utc=True)
+
+    codes, uniques = pd.factorize(created_at)
+    uniques = pd.Series(uniques, dtype=object)
+    parsed = pd.to_datetime(uniques.map(v1_to_iso), format=ISO_FORMAT, errors='coerce', utc=True)
+    failed = parsed.isna()
+    if failed.any():
+        parsed[failed] = pd.to_datetime(uniques[failed], errors='coerce', utc=True)
+
+    values = pd.DatetimeIndex(parsed).take(codes, allow_fill=True, fill_value=pd.NaT)
+    return pd.Series(values, index=created_at.index, name=created_at.name)
+
+
+class _FrameView:
+    """
+    rows and rewritten columns of a frame CleanTweets does not own. Steps read columns of the kept rows
+    and record new columns, the frame itself is only copied once, by materialise.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.positions = np.arange(len(df))
+        self.columns = {}
+        self.rewritten = set()
+
+    def __len__(self):
+        return len(self.positions)
+
+    def column(self, name: str) -> pd.Series:
+        if name not in self.columns:
+            self.columns[name] = self.df[name].take(self.positions)
+        return self.columns[name]
+
+    def set(self, name: str, values: pd.Series):
+        self.columns[name] = values
+        self.rewritten.add(name)
+
+    def keep(self, mask):
+        mask = np.asarray(mask, dtype=bool)
+        self.positions = self.positions[mask]
+        self.columns = {name: values[mask] for name, values in self.columns.items()}
+
+    def materialise(self) -> pd.DataFrame:
+        df = self.df.take(self.positions)
+        for name in self.rewritten:
+            df[name] = self.columns[name].array
+        return df
+
 
 class CleanTweets:
     """
     This class takes twitter dataframe generated by extract_dataframe.py and clean it
-    The class methods takes df arguments and they all return a cleaned dataset
+    The class methods takes df arguments and they all return a cleaned dataset, the df passed
+    in is never modified
 
     Arguments:
     -----------
 
     df= A twitter Dataset
+    author_blocklist= authors dropped by drop_retweets, SPAM_AUTHORS by default
+    near_duplicate_threshold= jaccard similarity of the cleaned texts above which drop_near_duplicates
+        keeps only one of the tweets
 
     Returns:
     --------
     A dataframe
     """
 
-    def __init__(self, df: pd.DataFrame):
+    # the cleaning steps run() applies by default, in order. drop_near_duplicates drops tweets the
+    # other steps keep, so it only runs when asked for in steps (right after drop_retweets)
+    STEPS = ['drop_unwanted_column', 'drop_retweets', 'convert_to_datetime', 'convert_to_numbers',
+             'remove_other_languages_tweets', 'treat_special_characters']
+
+    def __init__(self, df: pd.DataFrame, author_blocklist: list = None, near_duplicate_threshold: float = 0.8):
         self.df = df
+        self.author_blocklist = SPAM_AUTHORS if author_blocklist is None else author_blocklist
+        self.near_duplicate_threshold = near_duplicate_threshold
+        self.report = []
+
+    def run(self, df: pd.DataFrame = None, steps: list = None) -> pd.DataFrame:
+        """
+        run the cleaning steps (STEPS by default) on df (self.df by default) in one pass: the steps
+        only pick rows and compute new columns, the result is copied out of df once at the end.
+        df is left untouched and the result is owned by the caller. Steps already applied to df with
+        the same settings (recorded in df.attrs['cleaning_steps'], see step_key) are skipped, so
+        re-running on a cleaned frame only costs the copy of its result.
+
+        Args:
+        -----
+        df: dataframe to clean
+        steps: names of the CleanTweets methods to run, in order
+
+        Returns
+        -------
+        A new dataframe. self.report holds the profiler record (rows in/out, seconds, peak memory)
+        of every step run
+        """
+        df = self.df if df is None else df
+        done = df.attrs.get('cleaning_steps', [])
+        steps = [step for step in (self.STEPS if steps is None else steps) if self.step_key(step) not in done]
+        self.report = []
+        if not steps:
+            return df.copy()
+
+        view = _FrameView(df)
+        for step in steps:
+            with stage('CleanTweets.' + step, len(view)) as record:
+                getattr(self, '_' + step)(view)
+                record['rows_out'] = len(view)
+            self.report.append(dict(record, step=step))
+
+        with stage('CleanTweets.materialise', len(view)) as record:
+            df_clean = view.materialise()
+            df_clean.attrs['cleaning_steps'] = list(done) + [self.step_key(step) for step in steps]
+            record['rows_out'] = len(df_clean)
+        self.report.append(dict(record, step='materialise'))
+        return df_clean
+
+    def step_key(self, step: str) -> str:
+        """
+        step name with the settings its result depends on, e.g. "drop_near_duplicates(0.8)": a step
+        run with another author_blocklist or threshold is not the same step
+        """
+        settings = {'drop_retweets': sorted(set(self.author_blocklist)),
+                    'drop_near_duplicates': self.near_duplicate_threshold}
+        return '{}({!r})'.format(step, settings[step]) if step in settings else step
 
     def drop_unwanted_column(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         remove rows that has column names. This error originated from
         the data retrieving.
         """
-        unwanted_rows_index = df[df['retweet_count'] == 'retweet_count'].index
-        df.drop(unwanted_rows_index, inplace=True)
-        df = df[df['polarity'] != 'polarity']
-
-        return df
+        return self.run(df, ['drop_unwanted_column'])
 
     def drop_retweets(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         drop retweets
         """
-        # df = df.query("tweet_category=='Tweet' or tweet_category== 'Reply'")
-        df = df.drop_duplicates(subset=['original_text', 'original_author'])
-        df = df[df.original_author != 'RepDeFiFidonia']
-        df = df[df.original_author != 'republikaonline']
-        return df
+        return self.run(df, ['drop_retweets'])
+
+    def drop_near_duplicates(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        keep one tweet of every cluster of near duplicate cleaned texts (copy-pasta campaigns, tweets
+        posted again with a word changed), clustered with minhash/lsh in about linear time, see
+        near_duplicates.near_duplicate_clusters. The first tweet of a cluster is kept and gets the
+        size of its cluster in cluster_size. Retweets repeat their tweet's text by design, they are
+        left out of the clusters. Texts shorter than a shingle (5 characters once normalised) are only
+        clustered with identical texts. Not part of the default STEPS.
+        """
+        return self.run(df, ['drop_near_duplicates'])
 
     def convert_to_datetime(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         convert column to datetime
         """
-        df['created_at'] = pd.to_datetime(df['created_at'], errors='coerce')
-
-        return df
+        return self.run(df, ['convert_to_datetime'])
 
     def convert_to_numbers(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         convert columns like polarity, subjectivity, retweet_count
         favorite_count etc to numbers
         """
-        df['polarity'] = pd.to_numeric(df['polarity'], errors='coerce')
-        df['subjectivity'] = pd.to_numeric(df['subjectivity'], errors='coerce')
-        df['retweet_count'] = pd.to_numeric(df['retweet_count'], errors='coerce')
-        df['likes_count'] = pd.to_numeric(df['likes_count'], errors='coerce')
-
-        return df
+        return self.run(df, ['convert_to_numbers'])
 
     def remove_other_languages_tweets(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         remove non english,french, kinyarwanda tweets from lang
         """
-        df['lang'] = df['lang'].replace('in', value='kiny')
-        df['lang'] = df['lang'].replace('tl', value='kiny')
-        # df['lang'] = df['lang'].replace('de', value='kiny')
-        df['lang'] = df['lang'].replace('ht', value='kiny')
-
-        df.query("lang == 'en' | lang =='fr' | lang == 'kiny' ", inplace=True)
-
-        return df
+        return self.run(df, ['remove_other_languages_tweets'])
 
     def treat_special_characters(self, df: pd.DataFrame) -> pd.DataFrame:
         """"
-        Remove special characters and redundant characters which cause one location to come out many times
-        """
-        df['place'] = df['place'].str.lower()
-        df['place'] = df['place'].replace(r'^.*xico.*', value='Mexico', regex=True)
-        df['place'] = df['place'].replace(r'(^.*[kK]igali.*)|(^.*wanda.*)', value='Rwanda', regex=True)
-        df['place'] = df['place'].replace(r'(^.*[Kk]inshasa.*)|(.*congo.*)|(.*drc.*)|(.*rdc.*)|(.*démocratique du.*)',
-                                          value='DRC Congo',
-                                          regex=True)
-        df['place'] = df['place'].replace('bukavu', 'DR Congo', regex=True)
-        df['place'] = df['place'].replace('goma', 'DR Congo', regex=True)
-        return df
+        Remove special characters and redundant characters which cause one location to come out many times.
+        The patterns only run once per distinct place, every row is then mapped to its normalised place.
+        """
+        return self.run(df, ['treat_special_characters'])
+
+    def _drop_unwanted_column(self, view: _FrameView):
+        view.keep((view.column('retweet_count') != 'retweet_count') & (view.column('polarity') != 'polarity'))
+
+    def _drop_retweets(self, view: _FrameView):
+        # df = df.query("tweet_category=='Tweet' or tweet_category== 'Reply'")
+        duplicated = pd.MultiIndex.from_arrays([view.column('original_text'),
+                                                view.column('original_author')]).duplicated()
+        view.keep(~duplicated & ~view.column('original_author').isin(self.author_blocklist).values)
+
+    def _drop_near_duplicates(self, view: _FrameView):
+        texts = view.column('cleaned_text')
+        if 'tweet_category' in view.df.columns:
+            texts = texts.where(view.column('tweet_category') != 'Retweet')
+        clusters = near_duplicate_clusters(texts, self.near_duplicate_threshold)
+        cluster_size = np.bincount(clusters, minlength=len(clusters))[clusters]
+        view.set('cluster_size', pd.Series(cluster_size, index=texts.index))
+        view.keep(clusters == np.arange(len(clusters)))
+
+    def _convert_to_datetime(self, view: _FrameView):
+        created_at = view.column('created_at')
+        if not pd.api.types.is_datetime64_any_dtype(created_at):
+            view.set('created_at', parse_created_at(created_at))
+
+    def _convert_to_numbers(self, view: _FrameView):
+        for col in ['polarity', 'subjectivity', 'retweet_count', 'likes_count']:
+            values = view.column(col)
+            if not pd.api.types.is_numeric_dtype(values):
+                view.set(col, pd.to_numeric(values, errors='coerce'))
+
+    def _remove_other_languages_tweets(self, view: _FrameView):
+        lang = view.column('lang').replace(LANG_ALIASES)
+        view.set('lang', lang)
+        view.keep(lang.isin(KEEP_LANGS))
+
+    def _treat_special_characters(self, view: _FrameView):
+        place = view.column('place').str.lower()
+        places = place.dropna().unique()
+        view.set('place', place.map(dict(zip(places, map(normalise_place, places)))))
 
 
 if __name__ == "__main__":
-    tweet_df = pd.read_excel("processed_tweet_data.xlsx", engine='openpyxl')
+    tweet_df = pd.read_parquet("processed_tweet_data.parquet", engine='pyarrow')
     cleaner = CleanTweets(tweet_df)
 
-"""To use this class, use it's instance "cleaner" and call every needed method.
-    eg.: cleaner.drop_duplicate() return a new df with duplicate rows removed"""
+"""To use this class, use it's instance "cleaner" and call every needed method, or run several
+    steps at once: cleaner.run(steps=['drop_retweets', 'convert_to_numbers']) returns a new df and
+    cleaner.report the rows and time of every step"""
@@ -1,9 +1,20 @@
+import argparse
 import json
+import os
+from contextlib import contextmanager
+from multiprocessing import Pool
 import pandas as pd
 from textblob import TextBlob
 import numpy as np
 import re
 from cleantext import clean
+from clean_tweets_dataframe import parse_created_at
+from profiler import PROFILER, log_to_file, profiled, stage
+from search_index import SearchIndex, search_index_path, write_search_index
+from sentiment_cache import SentimentCache
+from tweet_schema import SCHEMAS, detect_schema
+from tweet_store import (ParquetChunkWriter, PartitionedTweetStore, entities_path, write_entities, write_tweet_chunks,
+                         write_tweets)
 
 
 def read_json(json_tweets_file: str) -> list:
@@ -29,6 +40,134 @@ def read_json(json_tweets_file: str) -> list:
     return len(tweets_list), tweets_list
 
 
+def read_json_batches(json_tweets_file: str, batch_size: int = 10000):
+    """
+    streaming json file reader: parses the file line by line and yields the tweets in
+    lists of at most batch_size, so only one batch is held in memory at a time
+    Args:
+    -----
+    json_tweets_file: str - path of a json file
+    batch_size: int - maximum number of tweets per batch
+
+    Returns
+    -------
+    A generator of lists of tweets
+    """
+    if batch_size < 1:
+        raise ValueError('batch_size must be a positive integer')
+
+    batch = []
+    with open(json_tweets_file, 'r') as file_use:
+        for tweets in file_use:
+            if not tweets.strip():
+                continue
+            batch.append(json.loads(tweets))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+
+    if batch:
+        yield batch
+
+
+# dtypes of the get_tweet_df columns, the ones left out stay object (python strings). followers and
+# friends are missing when a tweet has no author, hence the nullable Int32
+TWEET_DTYPES = {'source': 'category', 'polarity': 'float32', 'subjectivity': 'float32', 'sentiment': 'category',
+                'lang': 'category', 'likes_count': 'int32', 'reply_count': 'int32', 'retweet_count': 'int32',
+                'followers_count': 'Int32', 'friends_count': 'Int32', 'possibly_sensitive': 'boolean',
+                'tweet_category': 'category'}
+
+
+def typed_tweet_df(data_dic: dict) -> pd.DataFrame:
+    """
+    tweet dataframe of a dict of column lists with the TWEET_DTYPES schema, created_at parsed to UTC datetime64
+    """
+    df_columns = {}
+    for col, values in data_dic.items():
+        if col == 'created_at':
+            df_columns[col] = parse_created_at(values)
+        else:
+            df_columns[col] = pd.Series(values, dtype=TWEET_DTYPES.get(col, object))
+    return pd.DataFrame(df_columns)
+
+
+# text_cleaner patterns, applied in this order. Mentions and hashtags are fused into the
+# "RT " pass; links keep their own passes because removing a mention or hashtag can change
+# what a link pattern matches, and the output has to stay the same as the six re.sub calls
+RT_MENTION_HASHTAG_RE = re.compile(r"^RT |@[A-Za-z0-9:_]+|#[A-Za-z0-9_]+")
+HTTP_LINK_RE = re.compile(r"http\S+")
+WWW_LINK_RE = re.compile(r"www.\S+")
+
+
+def clean_tweet_text(tweet_text: str) -> str:
+    """
+    remove the retweet marker, mentions, hashtags and links from one tweet text
+    """
+    tweet_text = RT_MENTION_HASHTAG_RE.sub("", tweet_text)
+    tweet_text = HTTP_LINK_RE.sub("", tweet_text)
+    tweet_text = WWW_LINK_RE.sub("", tweet_text)
+    if tweet_text.startswith(" "):
+        tweet_text = tweet_text[1:]
+    return tweet_text
+
+
+def clean_text_series(text: pd.Series) -> pd.Series:
+    """
+    batch mode of clean_tweet_text over a whole Series of tweet texts, missing texts stay NaN.
+    One mapped pass is faster than chaining four .str.replace passes over the Series.
+    """
+    return text.map(clean_tweet_text, na_action='ignore')
+
+
+def score_sentiment(tweet_text) -> tuple:
+    """
+    sentiment scoring stage: computes polarity, subjectivity and the sentiment class of one
+    cleaned tweet text with a single TextBlob pass. Empty texts are not sent to TextBlob and
+    score as Neutral (what TextBlob returns for them), missing (NaN) texts score as NaN.
+
+    Returns
+    -------
+    A (polarity, subjectivity, sentiment_class) tuple
+    """
+    if not isinstance(tweet_text, str):
+        return np.nan, np.nan, np.nan
+    if not tweet_text.strip():
+        return 0.0, 0.0, 'Neutral'
+
+    sentiment = TextBlob(clean(tweet_text, no_emoji=True)).sentiment
+    if sentiment.polarity > 0:
+        sentiment_class = 'Positive'
+    elif sentiment.polarity < 0:
+        sentiment_class = 'Negative'
+    else:
+        sentiment_class = 'Neutral'
+
+    return sentiment.polarity, sentiment.subjectivity, sentiment_class
+
+
+def _init_sentiment_worker():
+    """process pool initializer: loads the TextBlob lexicon and cleantext once per worker"""
+    score_sentiment('warm up')
+
+
+@contextmanager
+def shared_sentiment_pool(extractor_kwargs: dict):
+    """
+    extractor kwargs for all the batches of a run: with sentiment_workers > 1 (and no sentiment_pool
+    yet) one process pool is started for the whole run and handed to every extractor, then closed
+    when the run ends, instead of a pool started and torn down per batch
+
+    Returns
+    -------
+    A context manager yielding the kwargs to pass to every TweetDfExtractor
+    """
+    if extractor_kwargs.get('sentiment_workers', 1) > 1 and extractor_kwargs.get('sentiment_pool') is None:
+        with Pool(extractor_kwargs['sentiment_workers'], initializer=_init_sentiment_worker) as pool:
+            yield dict(extractor_kwargs, sentiment_pool=pool)
+    else:
+        yield extractor_kwargs
+
+
 class TweetDfExtractor:
     """
     this function will parse tweets json into a pandas dataframe
@@ -38,279 +177,354 @@ class TweetDfExtractor:
     dataframe
     """
 
-    def __init__(self, tweets_list):
+    def __init__(self, tweets_list, sentiment_workers: int = 1, sentiment_chunksize: int = 1000,
+                 sentiment_cache=None, schema: str = None, sentiment_pool=None):
 
         self.tweets_list = tweets_list
+        # payload schema ('v2' or 'v1.1'), detected on the first tweet unless given
+        self.schema = schema or detect_schema(tweets_list)
+        if self.schema not in SCHEMAS:
+            raise ValueError('unknown tweet schema {!r}'.format(self.schema))
+        self.compiled_schema = SCHEMAS[self.schema]
+        # find_sentiments runs in a process pool when sentiment_workers > 1
+        self.sentiment_workers = sentiment_workers
+        self.sentiment_chunksize = sentiment_chunksize
+        # a running multiprocessing pool to score in instead (see shared_sentiment_pool), not closed here
+        self.sentiment_pool = sentiment_pool
+        # optional sentiment_cache.SentimentCache, texts found in it are not scored again
+        self.sentiment_cache = sentiment_cache
+        # seconds spent in each stage of the last build_tweet_df call, every stage is also
+        # recorded by profiler.PROFILER with its rows and peak memory
+        self.stage_times = {}
 
     # # an example function
     def find_statuses_count(self) -> list:
-        statuses_count = [x['user']['statuses_count'] for x in self.tweets_list]
-        return statuses_count
+        return self._find('statuses_count')
 
     def find_full_text(self) -> list:
-        text = []
-        for tweet in self.tweets_list:
-
-            if 'text' in tweet.keys():
-                text.append(str(tweet['text']).strip())
-            elif 'referenced_tweets' in tweet.keys() and 'in_reply_to_user' not in tweet.keys():
-                text.append(str(tweet['referenced_tweets'][0]['text']).strip())
-            else:
-                text.append(np.nan)
-        return text
+        return self._find('original_text')
 
     def text_cleaner(self, text: list) -> list:
         clean_text = []
         for tweet_text in text:
-            tweet_text = re.sub("^RT ", "", tweet_text)
-            # mentions and hashtags
-            tweet_text = re.sub("@[A-Za-z0-9:_]+", "", tweet_text)
-            tweet_text = re.sub("#[A-Za-z0-9_]+", "", tweet_text)
-            # remove links
-            tweet_text = re.sub("http\S+", "", tweet_text)
-            tweet_text = re.sub(r"www.\S+", "", tweet_text)
-            tweet_text = re.sub("^ ", "", tweet_text)
-
-            clean_text.append(tweet_text)
+            # tweets without text (np.nan) are kept as they are
+            clean_text.append(clean_tweet_text(tweet_text) if isinstance(tweet_text, str) else tweet_text)
         return clean_text
 
     def find_sentiments(self, text: list) -> list:
+        """
+        score every cleaned text. With sentiment_workers > 1 the texts are scored in a process
+        pool, sentiment_chunksize texts at a time; results keep the input order and are the
+        same as the serial ones. With a sentiment_cache, every distinct text is scored at most
+        once and texts already in the cache are not scored at all.
+        """
+        if self.sentiment_cache is not None:
+            text_scores = self.sentiment_cache.get_many({tweet for tweet in text if isinstance(tweet, str)})
+            new_text = list({tweet for tweet in text if isinstance(tweet, str) and tweet not in text_scores})
+            new_scores = dict(zip(new_text, self._score_texts(new_text)))
+            self.sentiment_cache.put_many(new_scores)
+            text_scores.update(new_scores)
+            scores = [text_scores[tweet] if isinstance(tweet, str) else score_sentiment(tweet) for tweet in text]
+        else:
+            scores = self._score_texts(text)
 
         polarity = []
         subjectivity = []
         sentiment_class = []
-        for tweet in text:
-            blob = TextBlob(clean(tweet, no_emoji=True))
-            sentiment = blob.sentiment
-            polarity.append(sentiment.polarity)
-            subjectivity.append(sentiment.subjectivity)
-
-            if sentiment.polarity > 0:
-                sentiment_class.append('Positive')
-            elif sentiment.polarity < 0:
-                sentiment_class.append('Negative')
-            else:
-                sentiment_class.append('Neutral')
+        for tweet_polarity, tweet_subjectivity, tweet_class in scores:
+            polarity.append(tweet_polarity)
+            subjectivity.append(tweet_subjectivity)
+            sentiment_class.append(tweet_class)
 
         return polarity, subjectivity, sentiment_class
 
-    def find_created_time(self) -> list:
-        created_at = [x['created_at'] for x in self.tweets_list]
+    def _score_texts(self, text: list) -> list:
+        if len(text) > self.sentiment_chunksize:
+            if self.sentiment_pool is not None:
+                return self.sentiment_pool.map(score_sentiment, text, chunksize=self.sentiment_chunksize)
+            if self.sentiment_workers > 1:
+                with Pool(self.sentiment_workers, initializer=_init_sentiment_worker) as pool:
+                    return pool.map(score_sentiment, text, chunksize=self.sentiment_chunksize)
+        return [score_sentiment(tweet) for tweet in text]
 
-        return created_at
+    def find_created_time(self) -> list:
+        return self._find('created_at')
 
     def find_source(self) -> list:
-        source = [x['source'] for x in self.tweets_list]
-
-        return source
+        return self._find('source')
 
     def find_screen_name(self) -> list:
-        screen_name = []
-        for tweet in self.tweets_list:
-            try:
-                screen_name.append(tweet['author']['username'])
-            except KeyError:
-                screen_name.append(np.nan)
-        return screen_name
+        return self._find('original_author')
 
     def find_followers_count(self) -> list:
-        followers_count = []
-        for tweet in self.tweets_list:
-            try:
-                followers_count.append(tweet['author']['public_metrics']['followers_count'])
-            except KeyError:
-                followers_count.append(np.nan)
-        return followers_count
+        return self._find('followers_count')
 
     def find_friends_count(self) -> list:
-        friends_count = []
-        for tweet in self.tweets_list:
-            try:
-                friends_count.append(tweet['author']['public_metrics']['following_count'])
-            except KeyError:
-                friends_count.append(np.nan)
-        return friends_count
+        return self._find('friends_count')
 
     def is_sensitive(self) -> list:
-
-        is_sensitive = [tweet['possibly_sensitive'] if 'possibly_sensitive' in tweet.keys() else None for tweet in
-                        self.tweets_list]
-
-        return is_sensitive
+        return self._find('possibly_sensitive')
 
     def find_likes_count(self) -> list:
-        likes_count = []
-        for tweet in self.tweets_list:
-            try:
-                likes_count.append(tweet['public_metrics']['like_count'])
-            except KeyError:
-                likes_count.append(0)
-
-        return likes_count
+        return self._find('likes_count')
 
     def find_reply_count(self) -> list:
-        reply_count = []
-        for tweet in self.tweets_list:
-            try:
-                reply_count.append(tweet['public_metrics']['reply_count'])
-            except KeyError:
-                reply_count.append(0)
-
-        return reply_count
+        return self._find('reply_count')
 
     def find_retweet_count(self) -> list:
-
-        retweet_count = []
-        for tweet in self.tweets_list:
-            # if 'public_metrics' in tweet.keys():
-            try:
-                retweet_count.append(tweet['public_metrics']['retweet_count'])
-            except KeyError:
-                retweet_count.append(0)
-
-        return retweet_count
+        return self._find('retweet_count')
 
     def find_hashtags(self) -> list:
-        hashtags = []
-        for tweet in self.tweets_list:
-            if 'entities' in tweet.keys() and 'hashtags' in tweet['entities'].keys():
-                hashtags.append(", ".join([hashtag['tag'] for hashtag in tweet['entities']['hashtags']]))
-            else:
-                hashtags.append(np.nan)
-        return hashtags
+        return self._find('hashtags')
 
     def find_retweet_hashtags(self) -> list:
-        retweet_hashtags = []
-        for tweet in self.tweets_list:
-            if 'referenced_tweets' in tweet.keys():
-                try:
-                    retweet_hashtags.append(", ".join(
-                        [hashtag['tag'] for hashtag in tweet['referenced_tweets'][0]['entities']['hashtags']]))
-                except:
-                    retweet_hashtags.append(np.nan)
-            else:
-                retweet_hashtags.append(np.nan)
-
-        return retweet_hashtags
+        return self._find('retweet_hashtags')
 
     def find_mentions(self) -> list:
-
-        mentions = []
-        for tweet in self.tweets_list:
-            if 'entities' in tweet.keys() and 'mentions' in tweet['entities'].keys():
-                mentions.append(", ".join([mention['username'] for mention in tweet['entities']['mentions']]))
-            else:
-                mentions.append(np.nan)
-
-        return mentions
+        return self._find('user_mentions')
 
     def find_lang(self) -> list:
-        lang = []
-        for tweet in self.tweets_list:
-            try:
-                lang.append(tweet['lang'])
-            except KeyError:
-                lang.append(np.nan)
-        return lang
+        return self._find('lang')
 
     def find_location(self) -> list:
-        location = []
-        for tweet in self.tweets_list:
-            try:
-                location.append(tweet['author']['location'])
-            except KeyError:
-                location.append(np.nan)
-        return location
+        return self._find('place')
 
     def get_tweet_id(self) -> list:
-        tweet_id = []
-        for tweet in self.tweets_list:
-            try:
-                tweet_id.append(str(tweet['id']))
-            except KeyError:
-                tweet_id.append(np.nan)
-        return tweet_id
+        return self._find('tweet_id')
 
     def get_tweet_url(self) -> list:
-        tweet_url = []
-        for tweet in self.tweets_list:
-            if 'referenced_tweets' not in tweet:
-                tweet_url.append("https://twitter.com/{}/status/{}".format(tweet['author']['username'], tweet['id']))
-
-                # try:
-                #     tweet_url.append(", ".join([url['expanded_url'] for url in tweet['entities']['urls']]))
-                # except KeyError:
-                #     continue
-            elif 'in_reply_to_user' in tweet or 'referenced_tweets' in tweet:
-                # try:
-                tweet_url.append("https://twitter.com/{}/status/{}".format(tweet['author']['username'], tweet['id']))
-            else:
-                # except KeyError:
-                tweet_url.append(np.nan)
-
-        return tweet_url
+        return self._find('tweet_url')
 
     def get_tweet_category(self) -> list:
-        tweet_type = []
-        for tweet in self.tweets_list:
-            if 'in_reply_to_user' in tweet and 'referenced_tweets' in tweet:
-                tweet_type.append('Reply')
-            elif 'referenced_tweets' in tweet and 'in_reply_to_user' not in tweet:
-                tweet_type.append('Retweet')
-            else:
-                tweet_type.append('Tweet')
-        return tweet_type
+        return self._find('tweet_category')
+
+    def _find(self, col: str) -> list:
+        """one column of every tweet, read with the compiled accessor of the batch schema"""
+        accessor = self.compiled_schema.accessors[col]
+        return [accessor(tweet) for tweet in self.tweets_list]
+
+    def extract_columns(self) -> dict:
+        """
+        single pass extractor: visits every tweet once and fills all the raw column
+        buffers together instead of walking tweets_list once per find_*/get_* method.
+        Values are the same as the ones returned by the per-column methods.
+
+        Returns
+        -------
+        A dict of column name -> list of values
+        """
+        return self.compiled_schema.extract(self.tweets_list)
+
+    def get_tweet_df(self, save=False, path='week2_new.parquet') -> pd.DataFrame:
+        df = self.build_tweet_df()
+        PROFILER.log_times('TweetDfExtractor.get_tweet_df', self.stage_times)
+        if save:
+            with stage('TweetDfExtractor.save', len(df)) as record:
+                write_tweets(df, path)
+                write_entities(self.build_entity_df(), entities_path(path))
+                write_search_index(df, search_index_path(path)).close()
+            print('File Successfully Saved to {} in {:.2f}s.!!!'.format(path, record['seconds']))
+
+        return df
 
-    def get_tweet_df(self, save=False) -> pd.DataFrame:
-        save = True
+    @profiled(rows_in=lambda self: len(self.tweets_list), rows_out=len)
+    def build_entity_df(self) -> pd.DataFrame:
+        """
+        normalised hashtag/mention table with one row per (tweet_id, entity), taken from the structured
+        entity lists that find_hashtags/find_mentions flatten into strings. Hashtags are lower cased.
+
+        Returns
+        -------
+        A dataframe with tweet_id, entity_type ('hashtag' or 'mention') and tag columns
+        """
+        # ('entities', <list>) paths and tag keys of the hashtags and user_mentions columns
+        hashtags = self.compiled_schema.fields['hashtags']
+        mentions = self.compiled_schema.fields['user_mentions']
+        tweet_ids, entity_types, tags = [], [], []
+        for tweet in self.tweets_list:
+            if 'id' not in tweet:
+                continue
+            tweet_id = str(tweet['id'])
+            entities = tweet.get('entities') or {}
+            for hashtag in entities.get(hashtags.path[-1]) or []:
+                tweet_ids.append(tweet_id)
+                entity_types.append('hashtag')
+                tags.append(hashtag[hashtags.item_key].lower())
+            for mention in entities.get(mentions.path[-1]) or []:
+                tweet_ids.append(tweet_id)
+                entity_types.append('mention')
+                tags.append(mention[mentions.item_key])
+
+        return pd.DataFrame({'tweet_id': tweet_ids, 'entity_type': pd.Categorical(entity_types), 'tag': tags})
+
+    @profiled(rows_in=lambda self: len(self.tweets_list), rows_out=len)
+    def build_tweet_df(self) -> pd.DataFrame:
         """required column to be generated you should be creative and add more features"""
         # columns = ['created_at', 'source', 'original_text', 'cleaned_text', 'polarity', 'polarity_clean',
         #            'subjectivity', 'subjectivity_clean', 'lang', 'likes_count', 'reply_count', 'retweet_count',
         #            'original_author', 'followers_count', 'friends_count', 'possibly_sensitive', 'hashtags',
         #            'user_mentions', 'place', 'tweet_url', 'tweet_id', 'tweet_category']
 
-        created_at = self.find_created_time()
-        source = self.find_source()
-        text = self.find_full_text()
-        text_new = self.text_cleaner(text)
-        polarity, subjectivity, _ = self.find_sentiments(text_new)
-        _, _, sentiment = self.find_sentiments(text_new)
-        lang = self.find_lang()
-        likes_count = self.find_likes_count()
-        reply_count = self.find_reply_count()
-        retweet_count = self.find_retweet_count()
-        screen_name = self.find_screen_name()
-        follower_count = self.find_followers_count()
-        friends_count = self.find_friends_count()
-        sensitivity = self.is_sensitive()
-        hashtags = self.find_hashtags()
-        retweet_hashtags = self.find_retweet_hashtags()
-        mentions = self.find_mentions()
-        location = self.find_location()
-        tweet_url = self.get_tweet_url()
-        tweet_id = self.get_tweet_id()
-        tweet_category = self.get_tweet_category()
-
-        data_dic = {'created_at': created_at, 'source': source, 'original_text': text, 'cleaned_text': text_new,
-                    'polarity': polarity, 'subjectivity': subjectivity, 'sentiment': sentiment, 'lang': lang,
-                    'likes_count': likes_count, 'reply_count': reply_count, 'retweet_count': retweet_count,
-                    'original_author': screen_name,
-                    'followers_count': follower_count, 'friends_count': friends_count,
-                    'possibly_sensitive': sensitivity, 'hashtags': hashtags, 'retweet_hashtags': retweet_hashtags,
-                    'user_mentions': mentions, 'place': location,
-                    'tweet_url': tweet_url, 'tweet_id': tweet_id, 'tweet_category': tweet_category}
-
-        df = pd.DataFrame.from_dict(data_dic, orient='index')
-        df = df.transpose()
-        if save:
-            df.to_excel('week2_new.xlsx', index=False)
-            print('File Successfully Saved.!!!')
+        self.stage_times = {}
+        n_tweets = len(self.tweets_list)
+        with stage('TweetDfExtractor.extract_columns', n_tweets) as record:
+            columns = self.extract_columns()
+            record['rows_out'] = n_tweets
+        self.stage_times['extract'] = record['seconds']
+
+        with stage('TweetDfExtractor.text_cleaner', n_tweets) as record:
+            text = columns['original_text']
+            text_new = self.text_cleaner(text)
+            record['rows_out'] = len(text_new)
+        self.stage_times['text_cleaner'] = record['seconds']
+
+        with stage('TweetDfExtractor.find_sentiments', n_tweets) as record:
+            polarity, subjectivity, sentiment = self.find_sentiments(text_new)
+            record['rows_out'] = len(sentiment)
+        self.stage_times['sentiment'] = record['seconds']
+
+        with stage('TweetDfExtractor.dataframe', n_tweets) as record:
+            data_dic = {'created_at': columns['created_at'], 'source': columns['source'], 'original_text': text,
+                        'cleaned_text': text_new, 'polarity': polarity, 'subjectivity': subjectivity,
+                        'sentiment': sentiment, 'lang': columns['lang'], 'likes_count': columns['likes_count'],
+                        'reply_count': columns['reply_count'], 'retweet_count': columns['retweet_count'],
+                        'original_author': columns['original_author'],
+                        'followers_count': columns['followers_count'], 'friends_count': columns['friends_count'],
+                        'possibly_sensitive': columns['possibly_sensitive'], 'hashtags': columns['hashtags'],
+                        'retweet_hashtags': columns['retweet_hashtags'],
+                        'user_mentions': columns['user_mentions'], 'place': columns['place'],
+                        'tweet_url': columns['tweet_url'], 'tweet_id': columns['tweet_id'],
+                        'tweet_category': columns['tweet_category']}
+
+            df = typed_tweet_df(data_dic)
+            record['rows_out'] = len(df)
+        self.stage_times['dataframe'] = record['seconds']
 
         return df
 
 
-if __name__ == "__main__":
-    _, tweet_list = read_json("data/week2_flat.json")
+def extract_to_parquet(json_tweets_file: str, path: str = 'week2_new.parquet', batch_size: int = 10000,
+                       **kwargs) -> int:
+    """
+    get_tweet_df(save=True) for json files of any size: the file is read batch_size tweets at a time
+    and every batch is extracted and written as one row group of path before the next one is read.
+    The hashtag/mention table and the search index are written next to path as the batches go.
+    Args:
+    -----
+    json_tweets_file: str - path of a json file
+    path: str - parquet file the tweets are written to
+    batch_size: int - maximum number of tweets extracted at a time
+    kwargs are passed to the extractor of every batch (e.g. sentiment_cache)
 
-    tweety = TweetDfExtractor(tweet_list)
-    df = tweety.get_tweet_df()
+    Returns
+    -------
+    The number of tweets written
+    """
+    search_index = None
+
+    def tweet_dfs():
+        nonlocal search_index
+        for batch in read_json_batches(json_tweets_file, batch_size):
+            tweety = TweetDfExtractor(batch, **kwargs)
+            df = tweety.build_tweet_df()
+            entity_writer.write(tweety.build_entity_df())
+            if search_index is None:
+                search_index = write_search_index(df, search_index_path(path))
+            else:
+                search_index.add(df)
+            yield df
+
+    with stage('extract_to_parquet') as record, shared_sentiment_pool(kwargs) as kwargs, \
+            ParquetChunkWriter(entities_path(path), store_frame=False) as entity_writer:
+        n_rows = write_tweet_chunks(tweet_dfs(), path)
+        if search_index is not None:
+            search_index.close()
+        record['rows_out'] = n_rows
+    print('{} tweets Successfully Saved to {} in {:.2f}s.!!!'.format(n_rows, path, record['seconds']))
+    return n_rows
+
+
+def extract_incremental(json_tweets_file: str, store: PartitionedTweetStore, batch_size: int = 10000,
+                        search_index: SearchIndex = None, **kwargs) -> int:
+    """
+    extract only the tweets of a json file that are not in store yet and append them to it, so
+    re-running on overlapping pulls costs as much as the new tweets. Existing partitions are
+    left as they are.
+    Args:
+    -----
+    json_tweets_file: str - path of a json file
+    store: PartitionedTweetStore - where the processed tweets go
+    batch_size: int - maximum number of tweets extracted at a time
+    search_index: SearchIndex - full text index the new tweets are added to, if any
+    kwargs are passed to the extractor of every batch (e.g. sentiment_cache)
+
+    Returns
+    -------
+    The number of new tweets
+    """
+    return extract_batches_incremental(read_json_batches(json_tweets_file, batch_size), store, search_index,
+                                       **kwargs)
+
+
+def extract_batches_incremental(tweet_batches, store: PartitionedTweetStore, search_index: SearchIndex = None,
+                                **kwargs) -> int:
+    """
+    extract_incremental for batches of raw tweets from any source (read_json_batches,
+    hydrate.TweetHydrator.iter_batches, ...). Every batch is appended to store before the next
+    one is taken.
+
+    Returns
+    -------
+    The number of new tweets
+    """
+    n_new = 0
+    with shared_sentiment_pool(kwargs) as kwargs:
+        for batch in tweet_batches:
+            new_tweets = store.unseen(batch)
+            if not new_tweets:
+                continue
+            tweety = TweetDfExtractor(new_tweets, **kwargs)
+            df = tweety.build_tweet_df()
+            store.append(df, tweety.build_entity_df())
+            if search_index is not None:
+                search_index.add(df)
+            n_new += len(new_tweets)
+    return n_new
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='extract a twarc json file into a tweet dataframe')
+    parser.add_argument('json_file', nargs='?', default='data/week2_flat.json')
+    parser.add_argument('--incremental', metavar='STORE_DIR',
+                        help='only process tweets not yet in this day partitioned store, and append them to it')
+    parser.add_argument('--batch-size', type=int, default=10000, help='tweets read and extracted at a time')
+    parser.add_argument('--sentiment-workers', type=int, default=1,
+                        help='processes scoring sentiment, one pool for the whole run when above 1')
+    parser.add_argument('--sentiment-chunksize', type=int, default=1000,
+                        help='texts sent to a scoring process at a time')
+    parser.add_argument('--profile-log', metavar='FILE', help='append a json line per pipeline stage to FILE')
+    parser.add_argument('--profile-memory', action='store_true', help='measure the peak memory of every stage')
+    parser.add_argument('--cprofile-dir', metavar='DIR', help='dump a cProfile of every outermost stage in DIR')
+    args = parser.parse_args()
+    if args.profile_log:
+        log_to_file(args.profile_log)
+    if args.profile_memory:
+        PROFILER.track_memory()
+    if args.cprofile_dir:
+        PROFILER.cprofile_dir = args.cprofile_dir
+
+    cache = SentimentCache('sentiment_cache.sqlite')
+    if args.incremental:
+        tweet_store = PartitionedTweetStore(args.incremental)
+        search_index = SearchIndex(os.path.join(args.incremental, 'search.sqlite'))
+        n_new = extract_incremental(args.json_file, tweet_store, batch_size=args.batch_size, search_index=search_index,
+                                    sentiment_cache=cache, sentiment_workers=args.sentiment_workers,
+                                    sentiment_chunksize=args.sentiment_chunksize)
+        search_index.close()
+        print('{} new tweets, {} in {}'.format(n_new, len(tweet_store), args.incremental))
+        tweet_store.close()
+    else:
+        extract_to_parquet(args.json_file, batch_size=args.batch_size, sentiment_cache=cache,
+                           sentiment_workers=args.sentiment_workers, sentiment_chunksize=args.sentiment_chunksize)
+    print('Sentiment cache: {}'.format(cache.stats()))
+    cache.close()
@@ -0,0 +1,375 @@
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+
+import aiohttp
+
+from extract_dataframe import extract_batches_incremental
+from search_index import SearchIndex
+from sentiment_cache import SentimentCache
+from tweet_store import PartitionedTweetStore
+
+logger = logging.getLogger('tweets_analyze.hydrate')
+
+TWEETS_URL = 'https://api.twitter.com/2/tweets'
+# the tweets lookup endpoint takes at most 100 ids per request
+MAX_IDS = 100
+# fields and expansions of twarc's v2 lookups, enough for every column of TweetDfExtractor
+LOOKUP_PARAMS = {
+    'expansions': 'author_id,in_reply_to_user_id,referenced_tweets.id,referenced_tweets.id.author_id,'
+                  'entities.mentions.username',
+    'tweet.fields': 'author_id,conversation_id,created_at,entities,id,in_reply_to_user_id,lang,public_metrics,'
+                    'text,possibly_sensitive,referenced_tweets,source',
+    'user.fields': 'created_at,description,id,location,name,public_metrics,username,verified',
+}
+
+
+def read_ids(ids_file: str) -> list:
+    """tweet ids of a file with one id per line (e.g. data/ids.txt), blank lines and repeated ids left out"""
+    with open(ids_file, 'r') as f:
+        return list(dict.fromkeys(line.strip() for line in f if line.strip()))
+
+
+def flatten_response(response: dict) -> list:
+    """
+    tweets of a v2 lookup response in twarc's flattened layout, the one read_json reads: the author
+    (and in_reply_to_user) objects and the referenced tweets of the includes are put inside every tweet
+    """
+    includes = response.get('includes', {})
+    users = {user['id']: user for user in includes.get('users', [])}
+    included_tweets = {tweet['id']: tweet for tweet in includes.get('tweets', [])}
+
+    def expand(tweet: dict) -> dict:
+        tweet = dict(tweet)
+        if tweet.get('author_id') in users:
+            tweet['author'] = users[tweet['author_id']]
+        if tweet.get('in_reply_to_user_id') in users:
+            tweet['in_reply_to_user'] = users[tweet['in_reply_to_user_id']]
+        return tweet
+
+    tweets = []
+    for tweet in response.get('data', []):
+        tweet = expand(tweet)
+        if 'referenced_tweets' in tweet:
+            tweet['referenced_tweets'] = [dict(referenced, **expand(included_tweets[referenced['id']]))
+                                          if referenced['id'] in included_tweets else referenced
+                                          for referenced in tweet['referenced_tweets']]
+        tweets.append(tweet)
+    return tweets
+
+
+class HydrationCheckpoint:
+    """
+    requests of a hydration run that are done, kept in an SQLite file so an interrupted run resumes
+    where it stopped. A request is keyed by a hash of its ids, so the same file can serve several id
+    lists. A request only counts as done once the tweets it returned were handed over and processed.
+
+    Arguments:
+    -----------
+
+    path= SQLite file of the checkpoint, ':memory:' for a checkpoint that only lives for this run
+
+    Returns:
+    --------
+    A checkpoint with `in`, mark and len
+    """
+
+    def __init__(self, path: str = ':memory:'):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS hydrated (key BLOB PRIMARY KEY)")
+        self.conn.commit()
+
+    @staticmethod
+    def request_key(ids: list) -> bytes:
+        return hashlib.blake2b(','.join(ids).encode('ascii'), digest_size=16).digest()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM hydrated").fetchone()[0]
+
+    def __contains__(self, ids: list) -> bool:
+        return self.conn.execute("SELECT 1 FROM hydrated WHERE key = ?",
+                                 (self.request_key(ids),)).fetchone() is not None
+
+    def mark(self, requests: list):
+        """record the id lists of requests as done"""
+        self.conn.executemany("INSERT OR IGNORE INTO hydrated VALUES (?)",
+                              [(self.request_key(ids),) for ids in requests])
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+class RateLimit:
+    """
+    requests left in the current rate limit window of the endpoint, from the x-rate-limit-remaining
+    and x-rate-limit-reset headers of the last response minus the requests still in flight.
+    Requests wait for the next window once it is used up.
+    """
+
+    def __init__(self):
+        self.remaining = None
+        self.reset = 0.0
+        self.in_flight = 0
+        self._announced_reset = None
+
+    def update(self, headers):
+        """read the headers of a response, while its request still counts as in flight"""
+        if 'x-rate-limit-remaining' in headers:
+            self.remaining = int(headers['x-rate-limit-remaining']) - (self.in_flight - 1)
+        if 'x-rate-limit-reset' in headers:
+            self.reset = float(headers['x-rate-limit-reset'])
+
+    def exhaust(self, wait: float):
+        """the window is used up (a 429), for wait seconds when the response gave no reset time"""
+        self.remaining = 0
+        if self.reset <= time.time():
+            self.reset = time.time() + wait
+
+    async def acquire(self):
+        """wait for a request of the window, release() it once its response is read"""
+        while self.remaining is not None and self.remaining <= 0 and time.time() < self.reset:
+            if self._announced_reset != self.reset:
+                self._announced_reset = self.reset
+                logger.warning('rate limit reached, sleeping %.1fs', self.reset - time.time())
+            # 1s of margin: the reset time is rounded to the second
+            await asyncio.sleep(self.reset - time.time() + 1)
+        if self.remaining is not None:
+            self.remaining -= 1
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+
+
+_DONE = object()
+
+
+class TweetHydrator:
+    """
+    asynchronous client of the v2 tweets lookup endpoint, turning tweet ids back into tweets (like
+    `twarc2 hydrate`). Ids are looked up 100 at a time by concurrency requests sharing one pool of
+    keep-alive connections. The rate limit headers are followed, 429s wait for the next window and
+    server/connection errors are retried after a growing pause (1, 4, 9, ... seconds, like twarc).
+
+    Arguments:
+    -----------
+
+    bearer_token= app bearer token of the api
+    api_url= url of the lookup endpoint, e.g. a local mock server
+    concurrency= number of requests in flight
+    checkpoint= HydrationCheckpoint of the run, None to hydrate every id
+    max_retries= attempts of a request that keeps failing before giving up
+    timeout= seconds allowed to one request
+
+    Returns:
+    --------
+    A client whose iter_batches(ids) yields lists of flattened tweets, ready for TweetDfExtractor
+    """
+
+    def __init__(self, bearer_token: str, api_url: str = TWEETS_URL, concurrency: int = 4,
+                 checkpoint: HydrationCheckpoint = None, max_retries: int = 8, timeout: float = 30):
+        if concurrency < 1:
+            raise ValueError('concurrency must be a positive integer')
+        self.bearer_token = bearer_token
+        self.api_url = api_url
+        self.concurrency = concurrency
+        self.checkpoint = checkpoint
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.rate_limit = RateLimit()
+        # requests sent and tweets received by the last run
+        self.requests = 0
+        self.tweets = 0
+
+    @staticmethod
+    def backoff(attempt: int) -> float:
+        return attempt ** 2 + random.random()
+
+    def pending_requests(self, ids: list) -> list:
+        """the id lists of the requests of ids that the checkpoint does not have yet"""
+        requests = [ids[i:i + MAX_IDS] for i in range(0, len(ids), MAX_IDS)]
+        if self.checkpoint is None:
+            return requests
+        return [request_ids for request_ids in requests if request_ids not in self.checkpoint]
+
+    async def fetch(self, session: aiohttp.ClientSession, ids: list) -> list:
+        """
+        look up at most 100 ids. Deleted and protected tweets are simply missing from the result.
+
+        Returns
+        -------
+        A list of flattened tweets
+        """
+        params = dict(LOOKUP_PARAMS, ids=','.join(ids))
+        attempt = 0
+        while True:
+            await self.rate_limit.acquire()
+            self.requests += 1
+            try:
+                async with session.get(self.api_url, params=params) as response:
+                    self.rate_limit.update(response.headers)
+                    if response.status == 200:
+                        return flatten_response(await response.json())
+                    status, error = response.status, (await response.text())[:200]
+            except (aiohttp.ClientError, asyncio.TimeoutError) as client_error:
+                status, error = None, repr(client_error)
+            finally:
+                self.rate_limit.release()
+
+            if status == 429:
+                self.rate_limit.exhaust(self.backoff(attempt + 1))
+                continue
+            if status is not None and status < 500:
+                raise RuntimeError('tweet lookup failed with {}: {}'.format(status, error))
+            attempt += 1
+            if attempt >= self.max_retries:
+                raise RuntimeError('tweet lookup failed {} times, last error {}: {}'.format(attempt, status, error))
+            pause = self.backoff(attempt)
+            logger.warning('caught %s from %s, sleeping %.1fs', status or error, self.api_url, pause)
+            await asyncio.sleep(pause)
+
+    async def _hydrate(self, requests: list, batch_size: int, results: queue.Queue):
+        """fetch every request, putting (done requests, tweets) groups of about batch_size tweets in results"""
+        pending = asyncio.Queue()
+        for request_ids in requests:
+            pending.put_nowait(request_ids)
+        group = {'requests': [], 'tweets': []}
+
+        async def hand_over():
+            done_group = dict(group)
+            group['requests'], group['tweets'] = [], []
+            # results is bounded, the put blocks a worker thread instead of the event loop
+            await asyncio.to_thread(results.put, (done_group['requests'], done_group['tweets']))
+
+        async def worker(session):
+            while not pending.empty():
+                request_ids = pending.get_nowait()
+                tweets = await self.fetch(session, request_ids)
+                self.tweets += len(tweets)
+                group['requests'].append(request_ids)
+                group['tweets'].extend(tweets)
+                if len(group['tweets']) >= batch_size:
+                    await hand_over()
+
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        async with aiohttp.ClientSession(connector=connector,
+                                         headers={'Authorization': 'Bearer ' + self.bearer_token},
+                                         timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
+            workers = [asyncio.ensure_future(worker(session)) for _ in range(self.concurrency)]
+            try:
+                await asyncio.gather(*workers)
+            finally:
+                for task in workers:
+                    task.cancel()
+        if group['requests']:
+            await hand_over()
+
+    def iter_batches(self, ids: list, batch_size: int = 1000):
+        """
+        hydrate ids, yielding the tweets as lists of about batch_size flattened tweets as soon as
+        they arrive (in no particular order). The lookups run in a background thread while the
+        caller processes a batch; with a checkpoint, the requests of a batch are marked done when
+        the caller asks for the next one, and requests already done are not sent again.
+        """
+        self.requests = self.tweets = 0
+        requests = self.pending_requests(ids)
+        results = queue.Queue(maxsize=2)
+        loop = asyncio.new_event_loop()
+        hydration = loop.create_task(self._hydrate(requests, batch_size, results))
+
+        def run():
+            try:
+                loop.run_until_complete(hydration)
+                results.put(_DONE)
+            except BaseException as error:
+                results.put(error)
+            finally:
+                loop.close()
+
+        thread = threading.Thread(target=run, name='tweet-hydrator', daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = results.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                done_requests, tweets = item
+                if tweets:
+                    yield tweets
+                if self.checkpoint is not None:
+                    self.checkpoint.mark(done_requests)
+        finally:
+            if thread.is_alive():
+                # the caller stopped early: cancel the lookups and unblock the hand overs
+                try:
+                    loop.call_soon_threadsafe(hydration.cancel)
+                except RuntimeError:
+                    pass  # the loop just finished
+                while thread.is_alive():
+                    try:
+                        results.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
+                while not results.empty():
+                    results.get_nowait()
+
+
+def hydrate_incremental(ids_file: str, store: PartitionedTweetStore, hydrator: TweetHydrator,
+                        batch_size: int = 1000, search_index: SearchIndex = None, **kwargs) -> int:
+    """
+    hydrate the ids of ids_file and append the tweets to a PartitionedTweetStore, without an
+    intermediate json file: every batch goes straight through TweetDfExtractor. A run interrupted
+    by an error or ^C resumes from the checkpoint of hydrator, tweets already in store (e.g. from
+    the batch that was being processed) are not appended twice.
+    Args:
+    -----
+    ids_file: str - file with one tweet id per line
+    store: PartitionedTweetStore - where the processed tweets go
+    hydrator: TweetHydrator - api client
+    batch_size: int - about the number of tweets extracted at a time
+    search_index: SearchIndex - full text index the new tweets are added to, if any
+    kwargs are passed to the extractor of every batch (e.g. sentiment_cache)
+
+    Returns
+    -------
+    The number of new tweets
+    """
+    return extract_batches_incremental(hydrator.iter_batches(read_ids(ids_file), batch_size), store, search_index,
+                                       **kwargs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='hydrate a list of tweet ids into a day partitioned tweet store')
+    parser.add_argument('ids_file', nargs='?', default='data/ids.txt')
+    parser.add_argument('store_dir', nargs='?', default='hydrated_store')
+    parser.add_argument('--api-url', default=TWEETS_URL, help='tweets lookup endpoint, e.g. of a mock server')
+    parser.add_argument('--concurrency', type=int, default=4, help='number of requests in flight')
+    parser.add_argument('--batch-size', type=int, default=1000, help='about the number of tweets extracted at a time')
+    args = parser.parse_args()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+    cache = SentimentCache('sentiment_cache.sqlite')
+    tweet_store = PartitionedTweetStore(args.store_dir)
+    search_index = SearchIndex(os.path.join(args.store_dir, 'search.sqlite'))
+    run_checkpoint = HydrationCheckpoint(os.path.join(args.store_dir, 'hydrate_checkpoint.sqlite'))
+    client = TweetHydrator(os.environ['BEARER_TOKEN'], api_url=args.api_url, concurrency=args.concurrency,
+                           checkpoint=run_checkpoint)
+    n_new = hydrate_incremental(args.ids_file, tweet_store, client, batch_size=args.batch_size,
+                                search_index=search_index, sentiment_cache=cache)
+    print('{} requests, {} new tweets, {} in {}'.format(client.requests, n_new, len(tweet_store), args.store_dir))
+    for resource in [run_checkpoint, search_index, tweet_store, cache]:
+        resource.close()
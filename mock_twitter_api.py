@@ -0,0 +1,167 @@
+import argparse
+import asyncio
+import math
+import random
+import threading
+import time
+
+from aiohttp import web
+
+
+def to_lookup_payload(tweet: dict) -> tuple:
+    """
+    the v2 lookup payload of a flattened tweet (e.g. from benchmark.make_synthetic_tweets), undoing
+    what hydrate.flatten_response does
+
+    Returns
+    -------
+    A (tweet, included users, included tweets) tuple
+    """
+    tweet = dict(tweet, id=str(tweet['id']))
+    users = []
+    author = tweet.pop('author', None)
+    if author is not None:
+        author = dict(author, id=author.get('id', author['username']))
+        tweet['author_id'] = author['id']
+        users.append(author)
+    reply_to = tweet.pop('in_reply_to_user', None)
+    if reply_to is not None:
+        reply_to = dict(reply_to, id=reply_to.get('id', reply_to['username']))
+        tweet['in_reply_to_user_id'] = reply_to['id']
+        users.append(reply_to)
+    included = []
+    if 'referenced_tweets' in tweet:
+        references = []
+        for i, referenced in enumerate(tweet['referenced_tweets']):
+            referenced = dict(referenced, id=str(referenced.get('id', '{}{}'.format(tweet['id'], i))))
+            references.append({'type': 'replied_to' if reply_to is not None else 'retweeted',
+                               'id': referenced['id']})
+            included.append(referenced)
+        tweet['referenced_tweets'] = references
+    return tweet, users, included
+
+
+class MockTweetAPI:
+    """
+    local stand-in of the v2 tweets lookup endpoint (GET /2/tweets?ids=...) for offline runs of
+    hydrate.py: serves the given tweets, answers unknown ids with "Not Found" errors like deleted
+    tweets, and enforces a rate limit of limit requests per window seconds with the x-rate-limit-*
+    headers and 429s. Every request takes latency seconds, a share error_rate of them fail with a 503.
+
+    Arguments:
+    -----------
+
+    tweets= flattened tweets to serve
+    limit= requests allowed per rate limit window
+    window= seconds of a rate limit window
+    latency= seconds taken by every request
+    error_rate= share of the requests answered with a 503
+
+    Returns:
+    --------
+    A server with start()/stop() and requests/rate_limited counters
+    """
+
+    def __init__(self, tweets: list, limit: int = 300, window: float = 15 * 60, latency: float = 0.05,
+                 error_rate: float = 0.0, seed: int = 0):
+        self.payloads = {str(tweet['id']): to_lookup_payload(tweet) for tweet in tweets}
+        self.limit = limit
+        self.window = window
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rand = random.Random(seed)
+        self.requests = 0
+        self.rate_limited = 0
+        self.failed = 0
+        self._used = 0
+        self._reset = 0.0
+        self._loop = None
+        self._runner = None
+        self._thread = None
+
+    async def lookup(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        now = time.time()
+        if now >= self._reset:
+            self._reset, self._used = now + self.window, 0
+        self._used += 1
+        headers = {'x-rate-limit-limit': str(self.limit),
+                   'x-rate-limit-remaining': str(max(self.limit - self._used, 0)),
+                   'x-rate-limit-reset': str(math.ceil(self._reset))}
+        if self._used > self.limit:
+            self.rate_limited += 1
+            return web.json_response({'title': 'Too Many Requests', 'status': 429}, status=429, headers=headers)
+
+        await asyncio.sleep(self.latency)
+        if self.rand.random() < self.error_rate:
+            self.failed += 1
+            return web.json_response({'title': 'Service Unavailable', 'status': 503}, status=503)
+        ids = request.query.get('ids', '').split(',')
+        if not request.headers.get('Authorization', '').startswith('Bearer ') or not 1 <= len(ids) <= 100:
+            return web.json_response({'title': 'Invalid Request', 'status': 400}, status=400, headers=headers)
+
+        data, users, included, errors = [], {}, {}, []
+        for tweet_id in ids:
+            if tweet_id not in self.payloads:
+                errors.append({'value': tweet_id, 'detail': 'Could not find tweet with ids: [{}].'.format(tweet_id),
+                               'title': 'Not Found Error', 'resource_type': 'tweet', 'parameter': 'ids'})
+                continue
+            tweet, tweet_users, tweet_included = self.payloads[tweet_id]
+            data.append(tweet)
+            users.update((user['id'], user) for user in tweet_users)
+            included.update((referenced['id'], referenced) for referenced in tweet_included)
+        response = {'data': data, 'includes': {'users': list(users.values()), 'tweets': list(included.values())}}
+        if errors:
+            response['errors'] = errors
+        return web.json_response(response, headers=headers)
+
+    def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """
+        serve in a background thread, on a free port by default
+
+        Returns
+        -------
+        The url of the lookup endpoint
+        """
+        app = web.Application()
+        app.router.add_get('/2/tweets', self.lookup)
+        self._loop = asyncio.new_event_loop()
+        self._runner = web.AppRunner(app, access_log=None)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, host, port)
+        self._loop.run_until_complete(site.start())
+        port = self._runner.addresses[0][1]
+        self._thread = threading.Thread(target=self._loop.run_forever, name='mock-twitter-api', daemon=True)
+        self._thread.start()
+        return 'http://{}:{}/2/tweets'.format(host, port)
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+if __name__ == "__main__":
+    from benchmark import make_synthetic_tweets
+    from hydrate import read_ids
+
+    parser = argparse.ArgumentParser(description='serve synthetic tweets for the ids of a file on a mock lookup api')
+    parser.add_argument('ids_file', nargs='?', default='data/ids.txt')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--limit', type=int, default=300, help='requests per rate limit window')
+    parser.add_argument('--window', type=float, default=60, help='seconds of a rate limit window')
+    parser.add_argument('--deleted', type=float, default=0.02, help='share of the ids that are not found')
+    args = parser.parse_args()
+
+    ids = read_ids(args.ids_file)
+    rand = random.Random(0)
+    kept_ids = [tweet_id for tweet_id in ids if rand.random() >= args.deleted]
+    tweets = [dict(tweet, id=tweet_id) for tweet, tweet_id in zip(make_synthetic_tweets(len(kept_ids)), kept_ids)]
+    server = MockTweetAPI(tweets, limit=args.limit, window=args.window)
+    print('serving {:,} of {:,} ids on {}'.format(len(tweets), len(ids), server.start(port=args.port)))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,155 @@
+from functools import reduce
+
+import pandas as pd
+
+CUBE_KEYS = ['lang', 'sentiment', 'day', 'tweet_category']
+TWEET_CATEGORIES = ['Tweet', 'Reply']
+# columns averaged per author by the tweets_per_user leaderboard
+AUTHOR_MEANS = ['polarity', 'likes_count', 'followers_count', 'retweet_count']
+
+
+def build_cube(df_full: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aggregate cube of the cleaned tweets keyed by (lang, sentiment, day, tweet_category), built once when
+    a dataset loads. Each cell holds the number of tweets, of non empty cleaned texts and the sums and
+    counts needed to average polarity and subjectivity, so chart callbacks only add up matching cells.
+    """
+    df_cube = df_full[['lang', 'sentiment', 'tweet_category', 'cleaned_text', 'polarity', 'subjectivity']].assign(
+        day=df_full['created_at'].dt.normalize())
+    cube = df_cube.groupby(CUBE_KEYS, observed=True, dropna=False).agg(
+        tweets=('tweet_category', 'size'),
+        text_count=('cleaned_text', 'count'),
+        polarity_sum=('polarity', 'sum'),
+        polarity_count=('polarity', 'count'),
+        subjectivity_sum=('subjectivity', 'sum'),
+        subjectivity_count=('subjectivity', 'count'))
+    return cube.reset_index()
+
+
+def build_author_followers(df_tweet: pd.DataFrame) -> pd.DataFrame:
+    """followers of every author per language, the value the most followed ranking keeps for an author"""
+    return df_tweet.groupby(['lang', 'original_author'], observed=True, as_index=False)['followers_count'].min()
+
+
+def build_author_rollup(df_tweet: pd.DataFrame) -> tuple:
+    """
+    author dimension of the dashboard tweets and their per sentiment partial aggregates. Authors get
+    integer ids in name order; every sentiment gets a frame indexed by author_id with the number of
+    cleaned texts and the sums and counts of AUTHOR_MEANS, so a leaderboard only adds up one frame
+    per selected sentiment.
+
+    Returns
+    -------
+    An (authors, rollup) tuple: a Series of original_author indexed by author_id and a dict of
+    sentiment -> partial aggregate
+    """
+    codes, names = pd.factorize(df_tweet['original_author'], sort=True)
+    authors = pd.Series(names, name='original_author').rename_axis('author_id')
+    df_rollup = df_tweet[['sentiment', 'cleaned_text'] + AUTHOR_MEANS].assign(author_id=codes.astype('int32'))
+    grouped = df_rollup[codes >= 0].groupby(['sentiment', 'author_id'], observed=True)
+    sums = grouped[AUTHOR_MEANS].sum().astype('float64').add_suffix('_sum')
+    counts = grouped[['cleaned_text'] + AUTHOR_MEANS].count().add_suffix('_count')
+    table = pd.concat([counts, sums], axis=1)
+    rollup = {sentiment: part.droplevel('sentiment') for sentiment, part in table.groupby(level='sentiment')}
+    return authors, rollup
+
+
+def author_leaderboard(authors: pd.Series, rollup: dict, sent_sel) -> pd.DataFrame:
+    """
+    number of cleaned texts and mean polarity, likes, followers and retweets of every author of the
+    selected sentiments, in name order. Merges at most one partial aggregate per sentiment.
+    """
+    parts = [rollup[sentiment] for sentiment in sent_sel if sentiment in rollup]
+    if not parts:
+        return pd.DataFrame(columns=['original_author', 'cleaned_text'] + AUTHOR_MEANS)
+    totals = reduce(lambda left, right: left.add(right, fill_value=0), parts)
+    board = pd.DataFrame({'original_author': authors.reindex(totals.index),
+                          'cleaned_text': totals['cleaned_text_count'].astype('int64')})
+    for col in AUTHOR_MEANS:
+        board[col] = totals[col + '_sum'] / totals[col + '_count']
+    return board.reset_index(drop=True)
+
+
+def author_links(board: pd.DataFrame) -> pd.DataFrame:
+    """the leaderboard with original_author rendered as a markdown link to the account"""
+    author = board['original_author'].astype(str)
+    return board.assign(original_author='[' + author + '](https://twitter.com/' + author + ')')
+
+
+def select_cells(cube: pd.DataFrame, lang_sel, categories=TWEET_CATEGORIES) -> pd.DataFrame:
+    """cube cells of the selected languages and tweet categories (all categories when None)"""
+    cells = cube[cube['lang'].isin(lang_sel)]
+    if categories is not None:
+        cells = cells[cells['tweet_category'].isin(categories)]
+    return cells
+
+
+def sentiment_counts(cube: pd.DataFrame, lang_sel) -> pd.DataFrame:
+    """number of tweets with a cleaned text per sentiment, in sentiment order"""
+    cells = select_cells(cube, lang_sel)
+    counts = cells.groupby('sentiment', observed=True)['text_count'].sum().reset_index(name='cleaned_text')
+    # observed=True lists the sentiments in order of first appearance, which changes with the selection
+    return counts.sort_values('sentiment', ignore_index=True)
+
+
+def daily_polarity(cube: pd.DataFrame, lang_sel, exclude_sentiment='Neutral') -> pd.DataFrame:
+    """average polarity and subjectivity per day, days without scores left out"""
+    cells = select_cells(cube, lang_sel)
+    cells = cells[~cells['sentiment'].isin([exclude_sentiment])]
+    sums = cells.groupby('day')[['polarity_sum', 'polarity_count', 'subjectivity_sum', 'subjectivity_count']].sum()
+    df_daily = pd.DataFrame({'polarity': sums['polarity_sum'] / sums['polarity_count'],
+                             'subjectivity': sums['subjectivity_sum'] / sums['subjectivity_count']})
+    df_daily.index.name = 'created_at'
+    return df_daily.dropna()
+
+
+def category_counts(cube: pd.DataFrame, lang_sel) -> pd.DataFrame:
+    """number of tweets per tweet category (retweets included), smallest first"""
+    cells = select_cells(cube, lang_sel, categories=None)
+    counts = cells.groupby('tweet_category', observed=True)['tweets'].sum().sort_values()
+    return counts.rename_axis('tweet_type').reset_index(name='count')
+
+
+def most_followed(author_followers: pd.DataFrame, lang_sel, top: int = 20) -> pd.DataFrame:
+    """the top most followed authors, in ascending order of followers"""
+    authors = author_followers[author_followers['lang'].isin(lang_sel)]
+    authors = authors.groupby('original_author', as_index=False)['followers_count'].min()
+    return authors.sort_values(by='followers_count').tail(top)
+
+
+def explode_entities(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    hashtag/mention table of a dataset saved without one, rebuilt from the comma joined hashtags and
+    user_mentions columns. Same layout as TweetDfExtractor.build_entity_df.
+    """
+    entity_dfs = []
+    for entity_type, col in [('hashtag', 'hashtags'), ('mention', 'user_mentions')]:
+        tags = df.set_index('tweet_id')[col].dropna().str.split(',').explode().str.strip()
+        tags = tags[tags != '']
+        if entity_type == 'hashtag':
+            tags = tags.str.lower()
+        entity_dfs.append(pd.DataFrame({'tweet_id': tags.index, 'entity_type': entity_type, 'tag': tags.values}))
+    entity_df = pd.concat(entity_dfs, ignore_index=True)
+    entity_df['entity_type'] = entity_df['entity_type'].astype('category')
+    return entity_df
+
+
+def build_entity_index(entity_df: pd.DataFrame, df_tweet: pd.DataFrame) -> pd.DataFrame:
+    """
+    inverted index of the hashtags and mentions of the dashboard tweets: number of tweets per
+    (entity_type, tag, lang, sentiment), so top-N queries never rescan the tweet texts
+    """
+    tweet_keys = df_tweet[['tweet_id', 'lang', 'sentiment']].drop_duplicates(subset=['tweet_id'])
+    entity_df = entity_df.merge(tweet_keys, on='tweet_id')
+    return entity_df.groupby(['entity_type', 'tag', 'lang', 'sentiment'], observed=True).size().reset_index(
+        name='count')
+
+
+def top_entities(entity_index: pd.DataFrame, entity_type: str, lang_sel, sentiment_sel=None,
+                 top: int = 10) -> pd.DataFrame:
+    """the top most used hashtags or mentions of the selection, in ascending order of count"""
+    rows = entity_index[(entity_index['entity_type'] == entity_type) & entity_index['lang'].isin(lang_sel)]
+    if sentiment_sel is not None:
+        rows = rows[rows['sentiment'].isin(sentiment_sel)]
+    counts = rows.groupby('tag')['count'].sum()
+    return counts.nlargest(top).sort_values().reset_index()
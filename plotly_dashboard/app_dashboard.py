@@ -1,9 +1,19 @@
+import os
+import sys
+import time
+
+_start_time = time.perf_counter()
+# the cleaning, profiling, search and word count modules live at the repository root, next to the
+# extractor that shares them, and are imported from there by every dashboard module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 import dash_bootstrap_components as dbc
 from dash import html
 from dash.dependencies import Output, Input
+from flask import jsonify, request
 from app import app
-import pandas as pd
-from flask_caching import Cache
+from datasets import get_dataset, reload_dataset
+from profiler import PROFILER, profiled
 # Connect to the layout and callbacks of each tab
 from viz import viz_layout
 from stats import stats_layout
@@ -17,29 +27,6 @@ tab_selected_style = {
     'padding': '6px'
 }
 
-cache = Cache(app.server, config={
-    'CACHE_TYPE': 'filesystem',
-    'CACHE_DIR': 'cache-directory'
-})
-TIMEOUT = 60
-
-
-@cache.memoize()
-def read_data(filename):
-    # Load  Tweets and Clean them
-    df_func = pd.read_excel(filename, engine='openpyxl', index_col=0, dtype={'tweet_id': 'str'})
-    return df_func
-
-
-df_selection = read_data(filename="week3_processed.xlsx")
-
-# ----- Find the start and End date of the tweets under analysis ------
-end_date = df_selection.created_at.head(1)
-end_date = end_date.loc[end_date.index[0]].date()
-
-start_date = df_selection.created_at.tail(2)
-start_date = start_date.loc[start_date.index[0]].date()
-
 app_tabs = html.Div(
     [
         dbc.Tabs(
@@ -59,25 +46,57 @@ app_tabs = html.Div(
     ], className="mt-3"
 )
 
-app.layout = dbc.Container(
-    [
-        dbc.Row(
-            dbc.Col(
-                [
-                    html.H3('Twitter Analysis Dashboard',
-                            style={'textAlign': 'center', 'font_family': "Times new Roman", 'font_weight': 'bolder',
-                                   'color': '#0F562F'}),
-                    html.P('Tweets between {} // {}'.format(start_date, end_date)
-                           )
-                ]
-            )
-        ),
 
-        dbc.Row(dbc.Col(app_tabs, width=12), className="mb-3"),
-        html.Div(id='content', children=[])
+def serve_layout():
+    # ----- Find the start and End date of the tweets under analysis ------
+    start_date, end_date = get_dataset().date_range
 
-    ]
-)
+    return dbc.Container(
+        [
+            dbc.Row(
+                dbc.Col(
+                    [
+                        html.H3('Twitter Analysis Dashboard',
+                                style={'textAlign': 'center', 'font_family': "Times new Roman",
+                                       'font_weight': 'bolder', 'color': '#0F562F'}),
+                        html.P('Tweets between {} // {}'.format(start_date, end_date)
+                               )
+                    ]
+                )
+            ),
+
+            dbc.Row(dbc.Col(app_tabs, width=12), className="mb-3"),
+            html.Div(id='content', children=[])
+
+        ]
+    )
+
+
+# a function layout is rebuilt on every page load, so the header follows reloaded datasets
+app.layout = serve_layout
+
+
+@app.server.route('/reload-dataset', methods=['POST'])
+def reload_week():
+    """load a new processed week (a parquet file next to the app) without restarting the server"""
+    filename = request.args.get('filename')
+    if filename is not None and (os.path.basename(filename) != filename or not filename.endswith('.parquet')
+                                 or not os.path.isfile(filename)):
+        return jsonify({'error': 'unknown dataset {}'.format(filename)}), 400
+    dataset = reload_dataset(filename)
+    return jsonify({'filename': dataset.filename, 'rows': len(dataset.df_full), 'load_times': dataset.load_times,
+                    'cleaning': dataset.cleaning_report.to_dict('records')})
+
+
+@app.server.route('/metrics')
+def metrics():
+    """
+    per stage timings, rows and peak memory (dataset loading, cleaning steps, callbacks) since the
+    server started, ?recent=N adds the last N stage records
+    """
+    recent = request.args.get('recent', 0, type=int)
+    return jsonify({'stages': PROFILER.summary(),
+                    'recent': list(PROFILER.records)[-recent:] if recent > 0 else []})
 
 
 @app.callback(
@@ -85,6 +104,7 @@ app.layout = dbc.Container(
     Output("content", "children"),
     [Input("tabs", "active_tab")]
 )
+@profiled('app_dashboard.switch_tab')
 def switch_tab(tab_chosen):
     if tab_chosen == "tab-viz":
         return viz_layout
@@ -96,4 +116,7 @@ def switch_tab(tab_chosen):
 
 
 if __name__ == '__main__':
+    dataset = get_dataset()
+    print('Dashboard ready in {:.2f}s ({} read {:.2f}s, clean {:.2f}s)'.format(
+        time.perf_counter() - _start_time, dataset.filename, dataset.load_times['read'], dataset.load_times['clean']))
     app.run_server(debug=True)
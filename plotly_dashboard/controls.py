@@ -9,3 +9,7 @@ SENTIMENT = {
     'Negative': 'Negative',
     'Neutral': 'Neutral'
 }
+
+# news outlets and spam accounts left out of the dashboard, on top of clean_tweets_dataframe.SPAM_AUTHORS
+AUTHOR_BLOCKLIST = ['dwnews', '123_INFO_DE', 'rogue_corq', 'Noticieros_MEX', 'EUwatchers', 'IndianExpress',
+                    'British_Airways']
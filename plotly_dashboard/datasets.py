@@ -0,0 +1,172 @@
+import itertools
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+import aggregates
+import clean_tweets_dataframe as cld
+from controls import AUTHOR_BLOCKLIST
+from profiler import stage
+from search_index import SearchIndex, search_index_path
+from word_freq import build_word_counts
+
+DEFAULT_FILENAME = "week3_processed.parquet"
+# load number of every TweetDataset, so caches can key on a loaded dataset without holding on to it
+_generations = itertools.count(1)
+
+
+# cleaning steps of the dashboard, run in one pass by CleanTweets.run. drop_near_duplicates is opted
+# into: copy-pasta campaigns count once in every chart
+CLEANING_STEPS = ['drop_unwanted_column', 'drop_retweets', 'drop_near_duplicates', 'convert_to_datetime',
+                  'convert_to_numbers', 'treat_special_characters']
+
+
+def clean_data(df_to_clean: pd.DataFrame) -> tuple:
+    """
+    Data Preparation and Filtering, df_to_clean is left as it is
+
+    Returns
+    -------
+    A (cleaned dataframe, per step report) tuple
+    """
+    cleaner = cld.CleanTweets(df_to_clean, author_blocklist=cld.SPAM_AUTHORS + AUTHOR_BLOCKLIST)
+    df_clean = cleaner.run(steps=CLEANING_STEPS)
+    return df_clean, pd.DataFrame(cleaner.report)
+
+
+class TweetDataset:
+    """
+    One processed week of tweets, read and cleaned once and shared by every dashboard tab.
+    The frames are shared read-only: tabs derive new frames from them and never modify them in place.
+
+    Attributes:
+    -----------
+
+    generation= load number of the dataset, a reload of the same file gets a new one
+    df_full= cleaned tweets of every category
+    df_tweet= cleaned original tweets and replies (retweets left out)
+    cube= aggregates keyed by (lang, sentiment, day, tweet_category), see aggregates.build_cube
+    author_followers= followers per (lang, author) for the most followed ranking
+    authors, author_rollup= author names by integer id and per sentiment author aggregates for the
+        tweets_per_user leaderboard, see aggregates.build_author_rollup
+    entity_index= hashtag/mention counts per (entity_type, tag, lang, sentiment), from the extractor's
+        <name>_entities.parquet table when there is one
+    word_counts= word counts per (sentiment, lang, tweet_category) of df_tweet, see word_freq.build_word_counts.
+        Counted after cleaning, so the clouds leave out the same tweets as every other chart
+    search_index= full text index of the tweet texts, the extractor's <name>_search.sqlite when there is one
+        and else built in memory from df_tweet
+    load_times= seconds spent reading, cleaning and aggregating the file
+    cleaning_report= rows in/out and seconds of every cleaning step
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.generation = next(_generations)
+
+        with stage('TweetDataset.read') as read:
+            df_og = pd.read_parquet(filename, engine='pyarrow')
+            read['rows_out'] = len(df_og)
+
+        with stage('TweetDataset.clean', len(df_og)) as clean:
+            self.df_full, self.cleaning_report = clean_data(df_og)
+            self.df_tweet = self.df_full.query("tweet_category=='Tweet' or tweet_category== 'Reply'")
+            clean['rows_out'] = len(self.df_full)
+
+        with stage('TweetDataset.aggregate', len(self.df_full)) as aggregate:
+            self.cube = aggregates.build_cube(self.df_full)
+            self.author_followers = aggregates.build_author_followers(self.df_tweet)
+            self.authors, self.author_rollup = aggregates.build_author_rollup(self.df_tweet)
+            entities_file = os.path.splitext(filename)[0] + '_entities.parquet'
+            if os.path.isfile(entities_file):
+                entity_df = pd.read_parquet(entities_file, engine='pyarrow')
+            else:
+                entity_df = aggregates.explode_entities(self.df_tweet)
+            self.entity_index = aggregates.build_entity_index(entity_df, self.df_tweet)
+            self.word_counts = build_word_counts(self.df_tweet)
+            aggregate['rows_out'] = len(self.cube)
+
+        with stage('TweetDataset.search_index', len(self.df_tweet)):
+            if os.path.isfile(search_index_path(filename)):
+                self.search_index = SearchIndex(search_index_path(filename))
+            else:
+                self.search_index = SearchIndex()
+                self.search_index.add(self.df_tweet)
+        self.load_times = {'read': read['seconds'], 'clean': clean['seconds'], 'aggregate': aggregate['seconds']}
+
+    @property
+    def date_range(self) -> tuple:
+        """first and last day of the tweets under analysis"""
+        return self.df_full.created_at.min().date(), self.df_full.created_at.max().date()
+
+
+class GenerationCache:
+    """
+    thread safe least recently used cache of values derived from a TweetDataset, keyed by the
+    dataset's generation so a reloaded file never gets the values of the one it replaced. Values of
+    an older generation are dropped as soon as one of a newer generation is stored.
+
+    Arguments:
+    -----------
+
+    maxsize= number of values kept, the least recently used one is dropped first
+
+    Returns:
+    --------
+    A cache with get/put
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, dataset: TweetDataset, key: tuple):
+        """the value stored for key of dataset, None when there is none"""
+        key = (dataset.generation,) + key
+        with self._lock:
+            if key not in self._values:
+                return None
+            self._values.move_to_end(key)
+            return self._values[key]
+
+    def put(self, dataset: TweetDataset, key: tuple, value):
+        key = (dataset.generation,) + key
+        with self._lock:
+            for old_key in [old_key for old_key in self._values if old_key[0] != dataset.generation]:
+                del self._values[old_key]
+            self._values[key] = value
+            self._values.move_to_end(key)
+            while len(self._values) > self.maxsize:
+                self._values.popitem(last=False)
+
+
+_lock = threading.Lock()
+_datasets = {}
+_active_filename = DEFAULT_FILENAME
+
+
+def get_dataset(filename: str = None) -> TweetDataset:
+    """
+    return the dataset of filename (the active week by default), loading it on first use only
+    """
+    with _lock:
+        filename = filename or _active_filename
+        if filename not in _datasets:
+            _datasets[filename] = TweetDataset(filename)
+        return _datasets[filename]
+
+
+def reload_dataset(filename: str = None) -> TweetDataset:
+    """
+    (re)load filename from disk and make it the only loaded, active week, e.g. when a new week
+    is processed. Callbacks pick it up on their next call, without restarting the server.
+    """
+    global _active_filename
+    dataset = TweetDataset(filename or _active_filename)
+    with _lock:
+        _datasets.clear()
+        _datasets[dataset.filename] = dataset
+        _active_filename = dataset.filename
+    return dataset
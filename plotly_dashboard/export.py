@@ -0,0 +1,82 @@
+import zlib
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+CHUNK_ROWS = 10000
+
+
+def iter_chunks(df: pd.DataFrame, positions: np.ndarray = None, chunk_rows: int = CHUNK_ROWS):
+    """
+    the rows of df at positions (every row when None), chunk_rows rows at a time: only one chunk
+    is copied out of df at a time. There is always at least one, maybe empty, chunk.
+    """
+    if positions is None:
+        positions = np.arange(len(df))
+    for start in range(0, max(len(positions), 1), chunk_rows):
+        yield df.iloc[positions[start:start + chunk_rows]]
+
+
+def iter_csv_gz(df: pd.DataFrame, positions: np.ndarray = None, chunk_rows: int = CHUNK_ROWS):
+    """
+    gzip compressed CSV of the rows of df at positions, produced and yielded chunk_rows rows at a
+    time so the whole export never sits in memory as one string
+    """
+    compressor = zlib.compressobj(wbits=31)  # 31: gzip header and trailer
+    for i, chunk in enumerate(iter_chunks(df, positions, chunk_rows)):
+        data = compressor.compress(chunk.to_csv(index=False, header=i == 0).encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class _StreamSink:
+    """write-only file object collecting what ParquetWriter writes until it is drained"""
+
+    def __init__(self):
+        self.buffer = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.buffer.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b''.join(self.buffer)
+        self.buffer = []
+        return data
+
+
+def iter_parquet(df: pd.DataFrame, positions: np.ndarray = None, chunk_rows: int = CHUNK_ROWS):
+    """
+    parquet file of the rows of df at positions written one row group of chunk_rows rows at a time,
+    every row group is yielded as soon as it is written. The schema comes from all of df, so a column
+    that is empty in the first chunk (e.g. retweet_hashtags) still gets its type.
+    """
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    sink = _StreamSink()
+    writer = pq.ParquetWriter(sink, schema)
+    for chunk in iter_chunks(df, positions, chunk_rows):
+        writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+EXPORT_FORMATS = {
+    'csv.gz': (iter_csv_gz, 'application/gzip'),
+    'parquet': (iter_parquet, 'application/vnd.apache.parquet'),
+}
@@ -0,0 +1,121 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# DataTable filter operators, in the symbolic and the named form. The i/s prefixes
+# (icontains, seq, ...) select case insensitive / sensitive matching.
+OPERATORS = {'=': 'eq', '!=': 'ne', '<': 'lt', '<=': 'le', '>': 'gt', '>=': 'ge',
+             'eq': 'eq', 'ne': 'ne', 'lt': 'lt', 'le': 'le', 'gt': 'gt', 'ge': 'ge',
+             'contains': 'contains', 'datestartswith': 'datestartswith'}
+
+FILTER_PART_RE = re.compile(
+    r"^\s*\{(?P<column>[^}]+)\}\s*"
+    r"(?P<operator>[si]?(?:eq|ne|lt|le|gt|ge|contains|datestartswith)|!=|<=|>=|=|<|>|is blank)"
+    r"\s*(?P<value>.*?)\s*$")
+
+
+def parse_value(value: str) -> str:
+    """
+    DataTable filter value: quoted strings are unquoted. The value stays a string, filter_mask
+    reads it as a number on numeric columns only (so tweet ids and years keep their digits)
+    """
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'`':
+        return value[1:-1].replace('\\' + value[0], value[0])
+    return value
+
+
+def as_number(value: str):
+    """value as a float, None when it is not a number"""
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def split_filter_query(filter_query: str) -> list:
+    """
+    split a DataTable filter_query ('{col} op value && ...') into (column, operator, value, case_sensitive)
+    tuples, case_sensitive is None when the operator has no i/s prefix. Parts this backend does not
+    understand are left out.
+    """
+    parts = []
+    for part in (filter_query or '').split(' && '):
+        match = FILTER_PART_RE.match(part)
+        if match is None:
+            continue
+        operator = match.group('operator')
+        case_sensitive = None
+        if operator[0] in 'si' and operator[1:] in OPERATORS:
+            case_sensitive = operator[0] == 's'
+            operator = operator[1:]
+        parts.append((match.group('column'), OPERATORS.get(operator, operator), parse_value(match.group('value')),
+                      case_sensitive))
+    return parts
+
+
+def filter_mask(df: pd.DataFrame, column: str, operator: str, value, case_sensitive: bool) -> pd.Series:
+    """vectorised boolean mask of one filter part"""
+    series = df[column]
+    if operator == 'is blank':
+        return series.isna() | (series.astype(str).str.strip() == '')
+    if operator in ('contains', 'datestartswith'):
+        text = series.astype(str)
+        value = str(value)
+        if not case_sensitive:
+            text, value = text.str.lower(), value.lower()
+        if operator == 'contains':
+            return series.notna() & text.str.contains(value, regex=False)
+        return series.notna() & text.str.startswith(value)
+
+    number = as_number(value) if pd.api.types.is_numeric_dtype(series) else None
+    if number is not None:
+        compared, value = series, number
+    else:
+        compared, value = series.astype(str), str(value)
+        if not case_sensitive:
+            compared, value = compared.str.lower(), value.lower()
+    return {'eq': compared == value, 'ne': compared != value, 'lt': compared < value, 'le': compared <= value,
+            'gt': compared > value, 'ge': compared >= value}[operator]
+
+
+def filter_query_mask(df: pd.DataFrame, filter_query: str, case_sensitive: bool = True) -> pd.Series:
+    """
+    boolean mask of the rows of df matching every part of a DataTable filter_query, parts on unknown
+    columns are ignored. case_sensitive is the table's filter_options case, used by operators without
+    an i/s prefix
+    """
+    mask = pd.Series(True, index=df.index)
+    for column, operator, value, part_case_sensitive in split_filter_query(filter_query):
+        if column in df.columns:
+            if part_case_sensitive is None:
+                part_case_sensitive = case_sensitive
+            mask &= filter_mask(df, column, operator, value, part_case_sensitive)
+    return mask
+
+
+def sort_positions(df: pd.DataFrame, positions: np.ndarray, sort_by: list) -> np.ndarray:
+    """
+    row positions of df ordered by a DataTable sort_by list ([{'column_id': ..., 'direction': 'asc'|'desc'}, ...]),
+    only the sort columns of those rows are copied
+    """
+    sort_by = [col for col in (sort_by or []) if col['column_id'] in df.columns]
+    if not sort_by:
+        return positions
+    keys = df[[col['column_id'] for col in sort_by]].iloc[positions].reset_index(drop=True)
+    order = keys.sort_values(by=list(keys.columns), ascending=[col['direction'] == 'asc' for col in sort_by],
+                             kind='mergesort').index.to_numpy()
+    return positions[order]
+
+
+def get_page(positions: np.ndarray, page_current: int, page_size: int) -> tuple:
+    """
+    row positions of the visible page
+
+    Returns
+    -------
+    A (page positions, page count) tuple
+    """
+    page_count = max(1, -(-len(positions) // page_size))
+    start = page_current * page_size
+    return positions[start:start + page_size], page_count
@@ -1,14 +1,22 @@
+import json
+from urllib.parse import urlencode
 from dash import html, dash_table, dcc
 from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
-from flask_caching import Cache
-import clean_tweets_dataframe as cld
-from dash.dependencies import Input, Output
+import numpy as np
 import pandas as pd
+from dash.dependencies import Input, Output
 from controls import LANGUAGES, SENTIMENT
+from flask import Response, abort, request, stream_with_context
 from app import app
+from datasets import GenerationCache, get_dataset
+from profiler import profiled, set_rows
+from export import EXPORT_FORMATS
+import server_table
 
-pd.options.mode.chained_assignment = None
+PAGE_SIZE = 50
+# filtered and sorted row positions kept for paging, one array of ints per table view
+MAX_VIEWS = 8
 
 lang_lst = [{'label': str(LANGUAGES[lang_in]),
              'value': str(lang_in)}
@@ -17,50 +25,15 @@ sent_lst = [{'label': str(SENTIMENT[sent_in]),
              'value': str(sent_in)}
             for sent_in in SENTIMENT]
 
-cache = Cache(app.server, config={
-    'CACHE_TYPE': 'filesystem',
-    'CACHE_DIR': 'cache-directory'
-})
-
-
-@cache.memoize()
-def read_data(filename):
-    # Load  Tweets and Clean them
-    df_func = pd.read_excel(filename, engine='openpyxl', index_col=0, dtype={'tweet_id': 'str'})
-    return df_func
-
-
-df_tweet_og = read_data(filename="week3_processed.xlsx")
-cleaner = cld.CleanTweets(df_tweet_og)
 
+def markdown_links(page: pd.DataFrame) -> pd.DataFrame:
+    """rows of a table page with the author and tweet url rendered as markdown links"""
+    author, url = page['original_author'].astype(str), page['tweet_url'].astype(str)
+    return page.assign(original_author='[' + author + '](https://twitter.com/' + author + ')',
+                       tweet_url='[' + url + '](' + url + ')')
 
-@cache.memoize()
-def clean_data(df_to_clean):
-    # Data Preparation and Filtering
-    df_to_clean = cleaner.drop_unwanted_column(df_to_clean)
-    df_to_clean = cleaner.drop_retweets(df_to_clean)
-    df_to_clean = cleaner.convert_to_datetime(df_to_clean)
-    df_to_clean = cleaner.convert_to_numbers(df_to_clean)
-    df_to_clean = cleaner.treat_special_characters(df_to_clean)
-    df_to_clean = df_to_clean[df_to_clean.original_author != 'dwnews']
-    df_to_clean = df_to_clean[df_to_clean.original_author != '123_INFO_DE']
-    df_to_clean = df_to_clean[df_to_clean.original_author != 'rogue_corq']
-    df_to_clean = df_to_clean[df_to_clean.original_author != 'Noticieros_MEX']
-    df_to_clean = df_to_clean[df_to_clean.original_author != 'EUwatchers']
-    df_to_clean = df_to_clean[df_to_clean.original_author != 'IndianExpress']
-    df_to_clean = df_to_clean[df_to_clean.original_author != 'British_Airways']
 
-    return df_to_clean
-
-
-df_tweet_full = clean_data(df_tweet_og)
-df_tweet = df_tweet_full.query("tweet_category=='Tweet' or tweet_category== 'Reply'")
-
-df_tweet['original_author'] = df_tweet['original_author'].apply(
-    lambda x: '[' + x + ']' + '(https://twitter.com/' + str(x) + ')')
-
-df_tweet['tweet_url'] = df_tweet['tweet_url'].apply(
-    lambda x: '[' + x + ']' + '(' + str(x) + ')')
+df_tweet = get_dataset().df_tweet
 
 table_cols = [
     {'name': i, 'id': i, 'presentation': 'markdown'} if i in ['original_author', 'tweet_url'] else {
@@ -87,18 +60,28 @@ table_css = [
                   'rule': 'background-color: grey; font-family: monospace; color: white'}]
 source_layout = html.Div(
     [
+        dbc.Row(
+            dbc.Col(
+                dcc.Input(id='search-query', type='search', debounce=True, value='',
+                          placeholder='Search tweets: words or "a phrase"', style={'width': '100%'}),
+                width=6), className='mb-2'),
         dbc.Row([
             dash_table.DataTable(
                 id='source-table',
-                data=df_tweet.to_dict('records'),
+                data=[],
                 columns=table_cols,
                 css=table_css,
                 hidden_columns=['original_text', 'possibly_sensitive', 'retweet_hashtags', 'polarity', 'subjectivity',
                                 'tweet_category', 'tweet_id'],
-                sort_action="native",
+                # paging, sorting and filtering run on the server, the browser only gets the visible page
+                page_action='custom',
+                page_current=0,
+                page_size=PAGE_SIZE,
+                sort_action='custom',
                 sort_mode='multi',
-                # sort_by=[],
-                filter_action="native",
+                sort_by=[],
+                filter_action='custom',
+                filter_query='',
                 filter_options={'case': 'insensitive'},
 
                 style_cell={
@@ -109,14 +92,8 @@ source_layout = html.Div(
                 },
                 style_table={'overflowX': 'auto', 'height': '300px', 'overflowY': 'auto'},
 
-                tooltip_data=[
-                    {
-                        column: {'value': str(value), 'type': 'markdown'}
-                        for column, value in row.items()
-                    } for row in df_tweet.to_dict('records')
-                ],
+                tooltip_data=[],
                 tooltip_duration=None,
-                virtualization=True,
                 fixed_rows={'headers': True},
                 style_header={'backgroundColor': 'rgb(30,30,30)',
                               'color': 'white',
@@ -143,8 +120,9 @@ source_layout = html.Div(
                     [
                         html.Div(
                             [
-                                html.Button("Download data", id="btn_csv"),
-                                dcc.Download(id="download-dataframe-csv"),
+                                html.A(html.Button("Download data"), id="download-link", href='', download=''),
+                                dcc.RadioItems(id='download-format', options=list(EXPORT_FORMATS),
+                                               value='csv.gz', inline=True),
                             ]
                         )
                     ], align='end', width=2),
@@ -162,21 +140,91 @@ source_layout = html.Div(
     ])
 
 
-@app.callback(Output('source-table', 'data'),
-              Input('sent_sel', 'value'))
-def filter_sentiment(sent_sel):
+_views = GenerationCache(MAX_VIEWS)
+
+
+def table_view(dataset, sent_sel: tuple, search: str, filter_query: str, sort_by: tuple) -> np.ndarray:
+    """
+    positions in dataset.df_tweet of the filtered and sorted source table rows, cached so paging
+    through them is only slicing. search is answered by the dataset's full text index, filter_query
+    by the table's column filters. The MAX_VIEWS most recently used views are kept, views of a
+    replaced dataset are dropped.
+    """
+    key = (sent_sel, search, filter_query, sort_by)
+    positions = _views.get(dataset, key)
+    if positions is None:
+        df = dataset.df_tweet
+        mask = df['sentiment'].isin(sent_sel)
+        if search.strip():
+            mask &= df['tweet_id'].isin(dataset.search_index.search(search))
+        mask &= server_table.filter_query_mask(df, filter_query, case_sensitive=False)
+        positions = server_table.sort_positions(df, np.flatnonzero(mask.to_numpy()),
+                                                [{'column_id': col, 'direction': direction}
+                                                 for col, direction in sort_by])
+        _views.put(dataset, key, positions)
+    return positions
+
+
+@app.callback([Output('source-table', 'data'),
+               Output('source-table', 'tooltip_data'),
+               Output('source-table', 'page_count')],
+              [Input('sent_sel', 'value'),
+               Input('source-table', 'page_current'),
+               Input('source-table', 'page_size'),
+               Input('source-table', 'sort_by'),
+               Input('source-table', 'filter_query'),
+               Input('search-query', 'value')])
+@profiled('source_tab.filter_sentiment')
+def filter_sentiment(sent_sel, page_current, page_size, sort_by, filter_query, search):
     if not sent_sel:
         raise PreventUpdate
     else:
-        dff = df_tweet.copy()
-        dff = dff[dff['sentiment'].isin(sent_sel)]
-        return dff.to_dict('records')
+        dataset = get_dataset()
+        positions = table_view(dataset, tuple(sorted(sent_sel)), search or '', filter_query or '',
+                               tuple((col['column_id'], col['direction']) for col in sort_by or []))
+        page, page_count = server_table.get_page(positions, page_current or 0, page_size or PAGE_SIZE)
+        set_rows(rows_in=len(positions), rows_out=len(page))
+        # only the rows of the page are rendered
+        records = markdown_links(dataset.df_tweet.iloc[page]).to_dict('records')
+        tooltip_data = [
+            {
+                column: {'value': str(value), 'type': 'markdown'}
+                for column, value in row.items()
+            } for row in records
+        ]
+        return records, tooltip_data, page_count
 
 
 @app.callback(
-    Output("download-dataframe-csv", "data"),
-    Input("btn_csv", "n_clicks"),
-    prevent_initial_call=True,
+    Output("download-link", "href"),
+    [Input('download-format', 'value'),
+     Input('sent_sel', 'value'),
+     Input('source-table', 'sort_by'),
+     Input('source-table', 'filter_query'),
+     Input('search-query', 'value')]
 )
-def func():
-    return dcc.send_data_frame(df_tweet.to_csv, "tweets.csv")
+@profiled('source_tab.download_link')
+def download_link(export_format, sent_sel, sort_by, filter_query, search):
+    # the export is streamed by the /download route with the filters active in the table
+    return '/download/tweets.{}?{}'.format(export_format, urlencode(
+        {'sentiment': sent_sel or [], 'search': search or '', 'filter_query': filter_query or '',
+         'sort_by': json.dumps(sort_by or [])}, doseq=True))
+
+
+@app.server.route('/download/tweets.<export_format>')
+def download_tweets(export_format):
+    if export_format not in EXPORT_FORMATS:
+        abort(404)
+    iter_export, mimetype = EXPORT_FORMATS[export_format]
+    try:
+        sort_by = tuple((str(col['column_id']), str(col['direction']))
+                        for col in json.loads(request.args.get('sort_by', '[]')))
+    except (ValueError, TypeError, KeyError):
+        abort(400)
+
+    dataset = get_dataset()
+    positions = table_view(dataset, tuple(sorted(request.args.getlist('sentiment'))), request.args.get('search', ''),
+                           request.args.get('filter_query', ''), sort_by)
+    # the rows are copied out of df_tweet one export chunk at a time
+    return Response(stream_with_context(iter_export(dataset.df_tweet, positions)), mimetype=mimetype,
+                    headers={'Content-Disposition': 'attachment; filename=tweets.{}'.format(export_format)})
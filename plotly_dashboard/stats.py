@@ -1,14 +1,19 @@
+import base64
+import io
 from dash import html, dash_table, dcc
 from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
-from flask_caching import Cache
-import clean_tweets_dataframe as cld
 from dash.dependencies import Input, Output
-import pandas as pd
 from controls import LANGUAGES, SENTIMENT
 from app import app
+from datasets import GenerationCache, get_dataset
+from profiler import profiled, set_rows
+import aggregates
+from wordcloud import WordCloud
+from word_freq import word_frequencies
 
-pd.options.mode.chained_assignment = None
+# word cloud images kept, one per (sentiments, languages) selection of the loaded dataset
+MAX_CLOUDS = 32
 
 lang_lst = [{'label': str(LANGUAGES[lang_in]),
              'value': str(lang_in)}
@@ -17,48 +22,36 @@ sent_lst = [{'label': str(SENTIMENT[sent_in]),
              'value': str(sent_in)}
             for sent_in in SENTIMENT]
 
-cache = Cache(app.server, config={
-    'CACHE_TYPE': 'filesystem',
-    'CACHE_DIR': 'cache-directory'
-})
 
+def draw_word_cloud(word_counts, sent_sel: tuple, lang_sel: tuple) -> str:
+    """
+    word cloud of the selected tweets as a png data uri, drawn from word counts.
+    max_font_size spares wordcloud its search for the largest font that fits
+    """
+    frequencies = word_frequencies(word_counts, sent_sel, lang_sel, aggregates.TWEET_CATEGORIES, max_words=100)
+    if not frequencies:
+        return ''
+    image = WordCloud(width=500, height=400, max_words=100, max_font_size=120).generate_from_frequencies(
+        frequencies).to_image()
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
 
-@cache.memoize()
-def read_data(filename):
-    # Load  Tweets and Clean them
-    df_func = pd.read_excel(filename, engine='openpyxl', index_col=0, dtype={'tweet_id': 'str'})
-    return df_func
 
+_clouds = GenerationCache(MAX_CLOUDS)
 
-df_tweet_og = read_data(filename="week3_processed.xlsx")
-cleaner = cld.CleanTweets(df_tweet_og)
 
+def word_cloud_src(dataset, sent_sel: tuple, lang_sel: tuple) -> str:
+    """
+    draw_word_cloud of the dataset's word counts, the MAX_CLOUDS most recently used images are kept.
+    Clouds of a replaced dataset are dropped.
+    """
+    src = _clouds.get(dataset, (sent_sel, lang_sel))
+    if src is None:
+        src = draw_word_cloud(dataset.word_counts, sent_sel, lang_sel)
+        _clouds.put(dataset, (sent_sel, lang_sel), src)
+    return src
 
-@cache.memoize()
-def clean_data(df_to_clean):
-    # Data Preparation and Filtering
-    df_to_clean = cleaner.drop_unwanted_column(df_to_clean)
-    df_to_clean = cleaner.drop_retweets(df_to_clean)
-    df_to_clean = cleaner.convert_to_datetime(df_to_clean)
-    df_to_clean = cleaner.convert_to_numbers(df_to_clean)
-    df_to_clean = cleaner.treat_special_characters(df_to_clean)
-    df_to_clean = df_to_clean[df_to_clean.original_author != 'dwnews']
-    df_to_clean = df_to_clean[df_to_clean.original_author != '123_INFO_DE']
-    df_to_clean = df_to_clean[df_to_clean.original_author != 'rogue_corq']
-    df_to_clean = df_to_clean[df_to_clean.original_author != 'Noticieros_MEX']
-    df_to_clean = df_to_clean[df_to_clean.original_author != 'EUwatchers']
-    df_to_clean = df_to_clean[df_to_clean.original_author != 'IndianExpress']
-    df_to_clean = df_to_clean[df_to_clean.original_author != 'British_Airways']
-
-
-    return df_to_clean
-
-
-df_tweet_full = clean_data(df_tweet_og)
-df_tweet = df_tweet_full.query("tweet_category=='Tweet' or tweet_category== 'Reply'")
-
-df_tweet['original_author'] = df_tweet['original_author'].apply(
-    lambda x: '[' + x + ']' + '(https://twitter.com/' + str(x) + ')')
 
 cols_use = ['original_author', 'cleaned_text', 'likes_count', 'followers_count', 'retweet_count']
 
@@ -101,13 +94,23 @@ stats_layout = html.Div(
                 dbc.Col(html.H5("Words Cloud From Tweets",
                                 style={'textAlign': 'center', 'font_family': "Times new Roman",
                                        'font_weight': 'bolder'})),
-                dbc.Col()
+                dbc.Col(
+                    [
+                        dcc.Dropdown(id='cloud_lang_sel',
+                                     options=lang_lst,
+                                     value=list(LANGUAGES.keys()),
+                                     multi=True,
+                                     placeholder='language',
+                                     style={'color': 'blue'}
+                                     )
+                    ], md=4
+                )
             ]),
         dbc.Row(
             [
                 dbc.Col(
                     dash_table.DataTable(id='tweets_per_user',
-                                         data=df_tweet.to_dict('records'),
+                                         data=[],
                                          columns=columns,
                                          css=table_css,
                                          style_data=table_layout[0]['style_data'],
@@ -122,7 +125,7 @@ stats_layout = html.Div(
                     md=4),
                 dbc.Col(
                     html.Div(
-                        html.Img(src=app.get_asset_url('cw_rdf_week3.png'), width="500", height="400")
+                        html.Img(id='word_cloud', width="500", height="400")
                     ), md=4),
             ]),
         # dbc.Row(
@@ -141,15 +144,24 @@ stats_layout = html.Div(
 @app.callback(Output('tweets_per_user', 'data'),
 
               Input('sent_sel', 'value'))
+@profiled('stats.filter_sentiment')
 def filter_sentiment(sent_sel):
     if not sent_sel:
         raise PreventUpdate
     else:
-        df_new = df_tweet.copy()
-        df_new = df_new[df_new['sentiment'].isin(sent_sel)]
-
-        dff = df_new.groupby(by=['original_author'], as_index=False).aggregate(
-            {'cleaned_text': 'count', 'polarity': 'mean', 'likes_count': 'mean', 'followers_count': 'mean',
-             'retweet_count': 'mean'})
+        dataset = get_dataset()
+        dff = aggregates.author_leaderboard(dataset.authors, dataset.author_rollup, sent_sel)
+        set_rows(rows_out=len(dff))
+        dff = aggregates.author_links(dff)
 
         return dff.to_dict('records')
+
+
+@app.callback(Output('word_cloud', 'src'),
+              [Input('sent_sel', 'value'),
+               Input('cloud_lang_sel', 'value')])
+@profiled('stats.make_word_cloud')
+def make_word_cloud(sent_sel, lang_sel):
+    if not sent_sel or not lang_sel:
+        raise PreventUpdate
+    return word_cloud_src(get_dataset(), tuple(sorted(sent_sel)), tuple(sorted(lang_sel)))
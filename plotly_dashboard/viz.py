@@ -1,66 +1,15 @@
-import pandas as pd
-from importlib import reload
-import clean_tweets_dataframe as cld
-import re
 from dash import dcc, html
 import dash_bootstrap_components as dbc
 from dash.dependencies import Input, Output
 from controls import LANGUAGES, SENTIMENT
 import plotly.express as px
 import copy
-from flask_caching import Cache
 from dash.exceptions import PreventUpdate
 
 from app import app
-
-reload(cld)
-
-cache = Cache(app.server, config={
-    'CACHE_TYPE': 'filesystem',
-    'CACHE_DIR': 'cache-directory'
-})
-TIMEOUT = 60
-
-
-@cache.memoize()
-def read_data(filename):
-    # Load  Tweets and Clean them
-    df_func = pd.read_excel(filename, engine='openpyxl', index_col=0, dtype={'tweet_id': 'str'})
-    return df_func
-
-
-df_tweet_og = read_data(filename="week3_processed.xlsx")
-cleaner = cld.CleanTweets(df_tweet_og)
-
-
-@cache.memoize()
-def clean_data(df_to_clean):
-    # Data Preparation and Filtering
-    df_to_clean = cleaner.drop_unwanted_column(df_to_clean)
-    df_to_clean = cleaner.drop_retweets(df_to_clean)
-    df_to_clean = cleaner.convert_to_datetime(df_to_clean)
-    df_to_clean = cleaner.convert_to_numbers(df_to_clean)
-    df_to_clean = cleaner.treat_special_characters(df_to_clean)
-    df_to_clean = df_to_clean[df_to_clean.original_author != 'dwnews']
-    df_to_clean = df_to_clean[df_to_clean.original_author != '123_INFO_DE']
-    df_to_clean = df_to_clean[df_to_clean.original_author != 'rogue_corq']
-    df_to_clean = df_to_clean[df_to_clean.original_author != 'Noticieros_MEX']
-    df_to_clean = df_to_clean[df_to_clean.original_author != 'EUwatchers']
-    df_to_clean = df_to_clean[df_to_clean.original_author != 'IndianExpress']
-    df_to_clean = df_to_clean[df_to_clean.original_author != 'British_Airways']
-
-    return df_to_clean
-
-
-df_tweet_full = clean_data(df_tweet_og)
-df_tweet = df_tweet_full.query("tweet_category=='Tweet' or tweet_category== 'Reply'")
-
-# sentiment summary
-df_tweet_date = df_tweet.set_index('created_at')
-df_tweet_date = df_tweet_date.resample('D').mean()[['polarity', 'subjectivity']].dropna()
-
-# sentiment average per day
-sent_over_time = px.line(df_tweet_date, x=df_tweet_date.index, y=['polarity', 'subjectivity'])
+from datasets import get_dataset
+from profiler import profiled
+import aggregates
 
 lang_lst = [{'label': str(LANGUAGES[lang_in]),
              'value': str(lang_in)}
@@ -147,41 +96,28 @@ viz_layout = html.Div(
                     ]
                 ),
 
-                dcc.Store(id='store-data', data=[], storage_type='memory')
+                dcc.Store(id='store-data', data={'lang': sorted(LANGUAGES)}, storage_type='memory')
             ], id="mainContainer"
         )
     ])
 
 
-# Helper Functions
-
-
-def make_countdf(df, col_name, new_colname):
-    df_count = pd.DataFrame(df[col_name].value_counts(ascending=True)).reset_index()
-    df_count.rename(columns={'index': new_colname, col_name: 'count'}, inplace=True)
-    return df_count
-
-
-def filter_dataframe(df, lang_sel):
-    dff = df[df['lang'].isin(lang_sel)]
-    return dff
-
-
 @app.callback(Output('store-data', 'data'),
               Input('lang_sel', 'value'))
+@profiled('viz.df_language')
 def df_language(lang_sel):
     if not lang_sel:
         raise PreventUpdate
     else:
-        df_selection = filter_dataframe(df_tweet, lang_sel)
-        return df_selection.to_dict('records')
+        # only the selection key goes to the browser, the rows stay on the server
+        return {'lang': sorted(lang_sel)}
 
 
 @app.callback(Output('sent_bar', 'figure'),
               Input('store-data', 'data'))
-def make_sentiment_bar(df_selection):
-    df_selection = pd.DataFrame(df_selection)
-    text_grouped = df_selection.groupby('sentiment').count()['cleaned_text'].reset_index()
+@profiled('viz.make_sentiment_bar')
+def make_sentiment_bar(selection):
+    text_grouped = aggregates.sentiment_counts(get_dataset().cube, selection['lang'])
 
     fig_senti = px.bar(text_grouped, x="sentiment", y="cleaned_text", text='cleaned_text', orientation="v",
                        title='Sentiment Category Distribution',
@@ -194,25 +130,12 @@ def make_sentiment_bar(df_selection):
 
 @app.callback(Output('hashtags_plot', 'figure'),
               Input('store-data', 'data'))
-def make_hashtag_plot(df_selection):
-    df_selection = pd.DataFrame(df_selection)
-
-    hashtag_dfo = df_selection[['original_text', 'hashtags', 'retweet_hashtags']]
-    hashtag_df = hashtag_dfo.copy()
-
-    def find_hashtags(df_tweets):
-        """This function will extract hashtags"""
-        return re.findall('(#[A-Za-z]+[A-Za-z0-9-_]+)', df_tweets)
+@profiled('viz.make_hashtag_plot')
+def make_hashtag_plot(selection):
+    hash_plotdf = aggregates.top_entities(get_dataset().entity_index, 'hashtag', selection['lang'], top=10)
+    hash_plotdf['hashtag'] = '#' + hash_plotdf['tag']
 
-    hashtag_df['hashtag_check'] = df_selection.original_text.apply(find_hashtags)
-    hashtag_df.dropna(subset=['hashtag_check'], inplace=True)
-    tags_list = list(hashtag_df['hashtag_check'])
-    hashtags_list_df = pd.DataFrame([tag for tags_row in tags_list for tag in tags_row], columns=['hashtag'])
-    hashtags_list_df['hashtag'] = hashtags_list_df['hashtag'].str.lower()
-
-    hash_plotdf = pd.DataFrame(
-        hashtags_list_df.value_counts(ascending=True), columns=['count']).reset_index()
-    hashtags_top = px.bar(hash_plotdf[len(hash_plotdf) - 10:len(hash_plotdf) + 1], x='count', y='hashtag',
+    hashtags_top = px.bar(hash_plotdf, x='count', y='hashtag',
                           orientation='h', title='Top 10 Hashtags',
                           text='count')
     hashtags_top.update_traces(texttemplate='%{text:.s}')
@@ -223,10 +146,9 @@ def make_hashtag_plot(df_selection):
 
 @app.callback(Output('average_pola_graph', 'figure'),
               Input('lang_sel', 'value'))
+@profiled('viz.make_avepolarity_plot')
 def make_avepolarity_plot(lang_sel):
-    df_selection = filter_dataframe(df_tweet, lang_sel)
-    df_tweet_date = df_selection.query("sentiment != 'Neutral'").set_index('created_at')
-    df_tweet_date = df_tweet_date.resample('D').mean()[['polarity', 'subjectivity']].dropna()
+    df_tweet_date = aggregates.daily_polarity(get_dataset().cube, lang_sel)
 
     # sentiment average per day
     sent_over_time = px.line(df_tweet_date, x=df_tweet_date.index, y=['polarity', 'subjectivity'],
@@ -237,17 +159,11 @@ def make_avepolarity_plot(lang_sel):
 
 @app.callback(Output('mostflwd_plot', 'figure'),
               Input('store-data', 'data'))
-def make_mostflwd_plots(df_selection):
-    df_selection = pd.DataFrame(df_selection)
-    #     # df_selection = df_selection.query('sentiment==@sent_sel')
-    d_mostflwd = df_selection[['original_author', 'followers_count']].sort_values(by='followers_count',
-                                                                                  ascending=True).drop_duplicates(
-        subset=['original_author'], keep='first')
-
-    d_mostflwd['username_link'] = d_mostflwd['original_author'].apply(
-        lambda x: '[' + x + ']' + '(https://twitter.com/' + str(x) + ')')
+@profiled('viz.make_mostflwd_plots')
+def make_mostflwd_plots(selection):
+    d_mostflwd = aggregates.most_followed(get_dataset().author_followers, selection['lang'], top=20)
 
-    most_flwd_plt = px.bar(d_mostflwd[len(d_mostflwd) - 20:len(d_mostflwd) + 1], y='original_author',
+    most_flwd_plt = px.bar(d_mostflwd, y='original_author',
                            x='followers_count', title='Most followed Accounts', orientation='h')
     most_flwd_plt.layout.update(layout)
     return most_flwd_plt
@@ -255,13 +171,13 @@ def make_mostflwd_plots(df_selection):
 
 @app.callback(Output('tweet_typepie', 'figure'),
               Input('lang_sel', 'value'))
+@profiled('viz.make_type_pie')
 def make_type_pie(lang_sel):
     if not lang_sel:
         raise PreventUpdate
     else:
-        df_selection = filter_dataframe(df_tweet_full, lang_sel)
         # Type of tweet
-        df_type = make_countdf(df_selection, 'tweet_category', 'tweet_type')
+        df_type = aggregates.category_counts(get_dataset().cube, lang_sel)
         fig_type = px.pie(df_type, values='count', names='tweet_type', hole=0.3, title='Type of Tweet')
         fig_type.layout.update(layout)
         return fig_type
@@ -269,17 +185,12 @@ def make_type_pie(lang_sel):
 
 @app.callback(Output('tweet_mentions', 'figure'),
               Input('store-data', 'data'))
-def mentions_count(df_selection):
-    df_selection = pd.DataFrame(df_selection)
-    mentions = list(df_selection['user_mentions'].dropna())
-
-    mentions_ls = []
-    for i in range(len(mentions)):
-        mentions_ls.append(mentions[i].split(','))
-    mention_df = pd.DataFrame([ment for ment_row in mentions_ls for ment in ment_row], columns=['mentions'])
-    mention_df = make_countdf(mention_df, 'mentions', 'mentioned_user')
+@profiled('viz.mentions_count')
+def mentions_count(selection):
+    mention_df = aggregates.top_entities(get_dataset().entity_index, 'mention', selection['lang'], top=20)
+    mention_df = mention_df.rename(columns={'tag': 'mentioned_user'})
 
-    mentions_plt = px.bar(mention_df[len(mention_df) - 20:len(mention_df) + 1], y='mentioned_user',
+    mentions_plt = px.bar(mention_df, y='mentioned_user',
                           x='count', title='Most mentioned Accounts', orientation='h')
     mentions_plt.layout.update(layout)
     mentions_plt.update_yaxes(type='category')
@@ -0,0 +1,189 @@
+import cProfile
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+# every finished stage is logged as one json line on this logger
+logger = logging.getLogger('tweets_analyze.profile')
+
+
+class StageProfiler:
+    """
+    wall time, rows in/out and peak memory of named pipeline stages (extractor methods, CleanTweets
+    steps, dashboard callbacks). Every finished stage is kept in records (the last max_records ones)
+    and logged as a json line on the 'tweets_analyze.profile' logger.
+
+    Peak memory needs tracemalloc, which slows python code down, so it is only measured after
+    track_memory() (or with TWEETS_PROFILE_MEMORY=1). Stages running in other threads at the same
+    time share the process wide peak. With a cprofile_dir, every outermost stage also runs under
+    cProfile and dumps <cprofile_dir>/<stage>-<n>.prof.
+
+    Arguments:
+    -----------
+
+    max_records= number of finished stages kept in memory
+    cprofile_dir= directory of the cProfile dumps, None for no dumps
+
+    Returns:
+    --------
+    A profiler with stage(), profiled() and summary()
+    """
+
+    def __init__(self, max_records: int = 1000, cprofile_dir: str = None):
+        self.records = deque(maxlen=max_records)
+        self.cprofile_dir = cprofile_dir
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._dumps = 0
+
+    @staticmethod
+    def track_memory():
+        """start measuring the peak memory of the stages"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _stack(self) -> list:
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def stage(self, name: str, rows_in: int = None):
+        """
+        time the block as the stage name. The yielded record is the one that gets logged, set
+        record['rows_out'] (or call set_rows) to report the rows the stage produced.
+        """
+        stack = self._stack()
+        record = {'stage': name, 'rows_in': rows_in, 'rows_out': None, 'seconds': None, 'peak_mb': None}
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            # the peak is reset for this stage, what the enclosing stage reached so far is kept aside
+            outer_peak = tracemalloc.get_traced_memory()[1]
+            if stack:
+                stack[-1]['_peak'] = max(stack[-1].get('_peak', 0), outer_peak)
+            tracemalloc.reset_peak()
+            record['_start_memory'] = tracemalloc.get_traced_memory()[0]
+
+        profile = None
+        if self.cprofile_dir is not None and not stack:
+            profile = cProfile.Profile()
+            profile.enable()
+        stack.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            stack.pop()
+            if profile is not None:
+                profile.disable()
+                self._dump(name, profile)
+            if tracing and tracemalloc.is_tracing():
+                peak = max(tracemalloc.get_traced_memory()[1], record.pop('_peak', 0))
+                record['peak_mb'] = (peak - record.pop('_start_memory')) / 1e6
+                if stack:
+                    stack[-1]['_peak'] = max(stack[-1].get('_peak', 0), peak)
+            self._finish(record)
+
+    def set_rows(self, rows_in: int = None, rows_out: int = None):
+        """report the rows of the innermost running stage of this thread"""
+        stack = self._stack()
+        if stack:
+            if rows_in is not None:
+                stack[-1]['rows_in'] = rows_in
+            if rows_out is not None:
+                stack[-1]['rows_out'] = rows_out
+
+    def profiled(self, name: str = None, rows_in=None, rows_out=None):
+        """
+        decorator running a function as a stage (named after the function by default)
+
+        Args:
+        -----
+        rows_in: function of the call arguments giving the input rows
+        rows_out: function of the result giving the output rows
+        """
+        def decorator(func):
+            stage_name = name or func.__qualname__
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(stage_name, rows_in(*args, **kwargs) if rows_in else None) as record:
+                    result = func(*args, **kwargs)
+                    if rows_out is not None:
+                        record['rows_out'] = rows_out(result)
+                    return result
+            return wrapper
+        return decorator
+
+    def _dump(self, name: str, profile: cProfile.Profile):
+        os.makedirs(self.cprofile_dir, exist_ok=True)
+        with self._lock:
+            self._dumps += 1
+            dump = self._dumps
+        profile.dump_stats(os.path.join(self.cprofile_dir, '{}-{}.prof'.format(name, dump)))
+
+    def _finish(self, record: dict):
+        record['time'] = time.time()
+        with self._lock:
+            self.records.append(record)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(record))
+
+    @staticmethod
+    def log_times(name: str, times: dict):
+        """log seconds per step of name (e.g. TweetDfExtractor.stage_times) as a json line, at debug level"""
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(json.dumps({'stage': name, 'step_seconds': times}))
+
+    def summary(self) -> dict:
+        """
+        per stage totals of the kept records
+
+        Returns
+        -------
+        A dict of stage -> calls, total/mean/max seconds, max peak_mb and the rows of the last call
+        """
+        with self._lock:
+            records = list(self.records)
+        stages = {}
+        for record in records:
+            stage = stages.setdefault(record['stage'], {'calls': 0, 'total_seconds': 0.0, 'max_seconds': 0.0,
+                                                        'max_peak_mb': None})
+            stage['calls'] += 1
+            stage['total_seconds'] += record['seconds']
+            stage['max_seconds'] = max(stage['max_seconds'], record['seconds'])
+            if record['peak_mb'] is not None:
+                stage['max_peak_mb'] = max(stage['max_peak_mb'] or 0.0, record['peak_mb'])
+            stage['last_rows_in'], stage['last_rows_out'] = record['rows_in'], record['rows_out']
+        for stage in stages.values():
+            stage['mean_seconds'] = stage['total_seconds'] / stage['calls']
+        return stages
+
+
+def log_to_file(path: str):
+    """write the stage records of the 'tweets_analyze.profile' logger as json lines to path"""
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+
+# process wide profiler, configured from the environment:
+# TWEETS_PROFILE_LOG=<file> json lines log, TWEETS_PROFILE_MEMORY=1 peak memory,
+# TWEETS_CPROFILE_DIR=<dir> cProfile dumps
+PROFILER = StageProfiler(cprofile_dir=os.environ.get('TWEETS_CPROFILE_DIR'))
+if os.environ.get('TWEETS_PROFILE_LOG'):
+    log_to_file(os.environ['TWEETS_PROFILE_LOG'])
+if os.environ.get('TWEETS_PROFILE_MEMORY') == '1':
+    PROFILER.track_memory()
+
+stage = PROFILER.stage
+profiled = PROFILER.profiled
+set_rows = PROFILER.set_rows
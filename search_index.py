@@ -0,0 +1,105 @@
+import os
+import re
+import sqlite3
+import threading
+
+import pandas as pd
+
+# words and "quoted phrases" of a search query
+QUERY_TOKEN_RE = re.compile(r'"([^"]*)"|(\S+)')
+# unicode61 splits on everything that is not a letter or a digit, and folds case and diacritics
+TOKENIZER = 'unicode61 remove_diacritics 2'
+
+
+def search_index_path(path: str) -> str:
+    """path of the full text index stored next to a tweet parquet file"""
+    return os.path.splitext(path)[0] + '_search.sqlite'
+
+
+def to_match_query(query: str) -> str:
+    """
+    turn a user query into an FTS5 MATCH expression: every bare word and every "quoted phrase"
+    must appear (in any order), FTS5 operators and special characters in the query are taken
+    literally. An empty query gives ''.
+    """
+    terms = []
+    for phrase, word in QUERY_TOKEN_RE.findall(query or ''):
+        term = phrase if phrase else word
+        if term.strip():
+            terms.append('"{}"'.format(term.replace('"', '""')))
+    return ' AND '.join(terms)
+
+
+class SearchIndex:
+    """
+    SQLite FTS5 full text index of the original_text and cleaned_text of tweets, keyed by tweet_id.
+    Queries are tokenised and case insensitive, see to_match_query. The connection is shared by
+    the dashboard threads, queries run one at a time.
+
+    Arguments:
+    -----------
+
+    path= SQLite file of the index, ':memory:' for an index that only lives in this process
+
+    Returns:
+    --------
+    An index with add/search
+    """
+
+    def __init__(self, path: str = ':memory:'):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS tweets_fts USING fts5("
+                          "tweet_id UNINDEXED, original_text, cleaned_text, tokenize='{}')".format(TOKENIZER))
+        self.conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM tweets_fts").fetchone()[0]
+
+    def add(self, df: pd.DataFrame):
+        """index the tweet_id, original_text and cleaned_text of the tweets of df"""
+        rows = df[['tweet_id', 'original_text', 'cleaned_text']].astype(object)
+        rows = rows.where(rows.notna(), None)
+        with self._lock:
+            self.conn.executemany("INSERT INTO tweets_fts (tweet_id, original_text, cleaned_text) VALUES (?, ?, ?)",
+                                  rows.itertuples(index=False, name=None))
+            self.conn.commit()
+
+    def search(self, query: str, limit: int = None) -> list:
+        """
+        tweet_ids of the tweets matching query, in index order, or the best limit matches (bm25)
+        first when a limit is given
+
+        Args:
+        -----
+        query: words and "quoted phrases" that must all appear in the text
+        limit: maximum number of ids, all of them by default
+
+        Returns
+        -------
+        A list of tweet_id strings, empty for an empty query
+        """
+        match = to_match_query(query)
+        if not match:
+            return []
+        sql = "SELECT tweet_id FROM tweets_fts WHERE tweets_fts MATCH ?"
+        params = [match]
+        if limit is not None:
+            sql += " ORDER BY rank LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            return [tweet_id for tweet_id, in self.conn.execute(sql, params)]
+
+    def close(self):
+        self.conn.close()
+
+
+def write_search_index(df: pd.DataFrame, path: str) -> SearchIndex:
+    """(re)build the full text index of the tweets of df in the SQLite file path"""
+    if os.path.exists(path):
+        os.remove(path)
+    index = SearchIndex(path)
+    index.add(df)
+    return index
@@ -0,0 +1,122 @@
+import hashlib
+import sqlite3
+
+# sqlite limits the number of ? placeholders of one statement
+QUERY_CHUNK = 500
+
+
+def select_in(conn: sqlite3.Connection, query: str, values: list, chunk_size: int = QUERY_CHUNK):
+    """
+    rows of query for all of values, query has one "IN ({})" that is filled with the ? placeholders
+    of chunk_size values at a time
+
+    Returns
+    -------
+    A generator of rows
+    """
+    for i in range(0, len(values), chunk_size):
+        chunk = values[i:i + chunk_size]
+        yield from conn.execute(query.format(', '.join('?' * len(chunk))), chunk)
+
+
+class SentimentCache:
+    """
+    persistent sentiment cache keyed by a hash of the cleaned tweet text. Scores are kept in an
+    SQLite file so repeated texts (retweets, copy-paste campaigns) skip TextBlob within a run
+    and across re-runs of extract_dataframe.py. The least recently used entries are evicted
+    once the cache holds more than max_entries texts.
+
+    Arguments:
+    -----------
+
+    path= SQLite file of the cache, ':memory:' for a cache that only lives for this run
+    max_entries= maximum number of cached texts
+
+    Returns:
+    --------
+    A cache with get_many/put_many and hits/misses counters
+    """
+
+    def __init__(self, path: str = 'sentiment_cache.sqlite', max_entries: int = 1_000_000):
+        if max_entries < 1:
+            raise ValueError('max_entries must be a positive integer')
+
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS sentiments (key BLOB PRIMARY KEY, polarity REAL, "
+                          "subjectivity REAL, sentiment TEXT, last_used INTEGER)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS sentiments_last_used ON sentiments (last_used)")
+        self.conn.commit()
+        # logical clock used for the LRU ordering, carried over from previous runs
+        self._clock = self.conn.execute("SELECT COALESCE(MAX(last_used), 0) FROM sentiments").fetchone()[0]
+        # rows of the table, counted once here and kept up to date by put_many
+        self._entries = self.conn.execute("SELECT COUNT(*) FROM sentiments").fetchone()[0]
+
+    @staticmethod
+    def text_key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+    def __len__(self):
+        return self._entries
+
+    def get_many(self, texts: list) -> dict:
+        """
+        look up the scores of several cleaned texts, hits and misses are counted once per
+        distinct text
+
+        Returns
+        -------
+        A dict of text -> (polarity, subjectivity, sentiment_class) for the cached texts only
+        """
+        keys = {self.text_key(text): text for text in texts}
+        found = {}
+        for key, polarity, subjectivity, sentiment in select_in(
+                self.conn, "SELECT key, polarity, subjectivity, sentiment FROM sentiments WHERE key IN ({})",
+                list(keys)):
+            found[keys[key]] = (polarity, subjectivity, sentiment)
+
+        if found:
+            self._clock += 1
+            found_keys = [(self._clock, self.text_key(text)) for text in found]
+            self.conn.executemany("UPDATE sentiments SET last_used = ? WHERE key = ?", found_keys)
+            self.conn.commit()
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, scores: dict):
+        """
+        store text -> (polarity, subjectivity, sentiment_class) scores, then evict the least
+        recently used entries above max_entries
+        """
+        if not scores:
+            return
+        self._clock += 1
+        rows = [(self.text_key(text), polarity, subjectivity, sentiment, self._clock)
+                for text, (polarity, subjectivity, sentiment) in scores.items()]
+        # new texts are inserted and counted, the scores of already cached ones are replaced
+        inserted = self.conn.executemany("INSERT OR IGNORE INTO sentiments VALUES (?, ?, ?, ?, ?)", rows).rowcount
+        if inserted < len(rows):
+            self.conn.executemany("UPDATE sentiments SET polarity = ?, subjectivity = ?, sentiment = ?, last_used = ? "
+                                  "WHERE key = ?", [row[1:] + row[:1] for row in rows])
+        self._entries += inserted
+
+        overflow = self._entries - self.max_entries
+        if overflow > 0:
+            self._entries -= self.conn.execute("DELETE FROM sentiments WHERE key IN "
+                                               "(SELECT key FROM sentiments ORDER BY last_used LIMIT ?)",
+                                               (overflow,)).rowcount
+        self.conn.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self),
+                'hit_rate': self.hits / lookups if lookups else 0.0}
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,12 @@
+from benchmark import legacy_per_method_columns, make_synthetic_tweets
+from extract_dataframe import TweetDfExtractor
+
+
+def test_extract_columns_matches_legacy_per_method_columns():
+    tweets = make_synthetic_tweets(2000)
+    expected = legacy_per_method_columns(tweets)
+    columns = TweetDfExtractor(tweets).extract_columns()
+    assert list(columns) == list(expected)
+    # np.nan != np.nan, so compare with repr to treat missing values as equal
+    for col in expected:
+        assert list(map(repr, columns[col])) == list(map(repr, expected[col])), col
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+
+from benchmark import golden_texts, legacy_text_cleaner
+from extract_dataframe import TweetDfExtractor, clean_text_series, clean_tweet_text
+
+
+def test_clean_tweet_text_matches_legacy():
+    golden = golden_texts()
+    assert [clean_tweet_text(text) for text in golden] == legacy_text_cleaner(golden)
+
+
+def test_text_cleaner_matches_legacy():
+    golden = golden_texts()
+    assert TweetDfExtractor([]).text_cleaner(golden) == legacy_text_cleaner(golden)
+
+
+def test_clean_text_series_matches_legacy():
+    golden = golden_texts()
+    assert clean_text_series(pd.Series(golden)).tolist() == legacy_text_cleaner(golden)
+
+
+def test_missing_texts_stay_missing():
+    texts = ['RT @a: see http://x.co/1', np.nan, 'www.y.com #tag text', None]
+    expected = legacy_text_cleaner([texts[0], texts[2]])
+
+    cleaned = clean_text_series(pd.Series(texts, dtype=object))
+    assert cleaned.isna().tolist() == [False, True, False, True]
+    assert cleaned[[0, 2]].tolist() == expected
+
+    cleaned = TweetDfExtractor([]).text_cleaner(texts)
+    assert [cleaned[0], cleaned[2]] == expected
+    assert cleaned[1] is np.nan and cleaned[3] is None
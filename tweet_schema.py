@@ -0,0 +1,199 @@
+from collections import namedtuple
+
+import numpy as np
+
+# raw columns of TweetDfExtractor.extract_columns, in order
+RAW_COLUMNS = ['created_at', 'source', 'original_text', 'lang', 'likes_count', 'reply_count', 'retweet_count',
+               'original_author', 'followers_count', 'friends_count', 'possibly_sensitive', 'hashtags',
+               'retweet_hashtags', 'user_mentions', 'place', 'tweet_url', 'tweet_id', 'tweet_category']
+
+# value of a column when its field is missing, np.nan for the columns not listed
+COLUMN_DEFAULTS = {'likes_count': 0, 'reply_count': 0, 'retweet_count': 0, 'possibly_sensitive': None}
+
+# a field spec is either a tuple of keys from the tweet down to the field, a Joined list field
+# (the item_key of every item joined with ', ', np.nan without a list) or a function of the tweet
+Joined = namedtuple('Joined', ['path', 'item_key'])
+
+_EMPTY = {}
+
+
+def _strip_text(text):
+    return np.nan if text is None else str(text).strip()
+
+
+def _join(items, item_key: str):
+    return np.nan if items is None else ", ".join([item[item_key] for item in items])
+
+
+def _tweet_id(tweet):
+    return str(tweet['id']) if 'id' in tweet else np.nan
+
+
+def _v2_referenced(tweet) -> dict:
+    referenced = tweet.get('referenced_tweets')
+    return referenced[0] if referenced else _EMPTY
+
+
+def _v2_text(tweet):
+    if 'text' in tweet:
+        return str(tweet['text']).strip()
+    if 'referenced_tweets' in tweet and 'in_reply_to_user' not in tweet:
+        return _strip_text(_v2_referenced(tweet).get('text'))
+    return np.nan
+
+
+def _v2_retweet_hashtags(tweet):
+    return _join((_v2_referenced(tweet).get('entities') or _EMPTY).get('hashtags'), 'tag')
+
+
+def _v2_url(tweet) -> str:
+    return "https://twitter.com/{}/status/{}".format((tweet.get('author') or _EMPTY).get('username', np.nan),
+                                                     tweet.get('id'))
+
+
+def _v2_category(tweet) -> str:
+    if 'referenced_tweets' not in tweet:
+        return 'Tweet'
+    return 'Reply' if 'in_reply_to_user' in tweet else 'Retweet'
+
+
+def _v1_text(tweet):
+    return _strip_text(tweet.get('full_text', tweet.get('text')))
+
+
+def _v1_retweet_hashtags(tweet):
+    referenced = tweet.get('retweeted_status') or tweet.get('quoted_status') or _EMPTY
+    return _join((referenced.get('entities') or _EMPTY).get('hashtags'), 'text')
+
+
+def _v1_url(tweet) -> str:
+    return "https://twitter.com/{}/status/{}".format((tweet.get('user') or _EMPTY).get('screen_name', np.nan),
+                                                     tweet.get('id'))
+
+
+def _v1_category(tweet) -> str:
+    if tweet.get('in_reply_to_status_id') is not None:
+        return 'Reply'
+    return 'Retweet' if 'retweeted_status' in tweet or 'quoted_status' in tweet else 'Tweet'
+
+
+# where every raw column (and statuses_count) is found, per payload schema: 'v2' for twarc's
+# flattened v2 tweets, 'v1.1' for api v1.1 ones such as frugumire.json
+SCHEMA_FIELDS = {
+    'v2': {
+        'created_at': ('created_at',), 'source': ('source',), 'original_text': _v2_text, 'lang': ('lang',),
+        'likes_count': ('public_metrics', 'like_count'), 'reply_count': ('public_metrics', 'reply_count'),
+        'retweet_count': ('public_metrics', 'retweet_count'), 'original_author': ('author', 'username'),
+        'followers_count': ('author', 'public_metrics', 'followers_count'),
+        'friends_count': ('author', 'public_metrics', 'following_count'),
+        'possibly_sensitive': ('possibly_sensitive',), 'hashtags': Joined(('entities', 'hashtags'), 'tag'),
+        'retweet_hashtags': _v2_retweet_hashtags, 'user_mentions': Joined(('entities', 'mentions'), 'username'),
+        'place': ('author', 'location'), 'tweet_url': _v2_url, 'tweet_id': _tweet_id, 'tweet_category': _v2_category,
+        'statuses_count': ('author', 'public_metrics', 'tweet_count'),
+    },
+    'v1.1': {
+        'created_at': ('created_at',), 'source': ('source',), 'original_text': _v1_text, 'lang': ('lang',),
+        'likes_count': ('favorite_count',), 'reply_count': ('reply_count',), 'retweet_count': ('retweet_count',),
+        'original_author': ('user', 'screen_name'), 'followers_count': ('user', 'followers_count'),
+        'friends_count': ('user', 'friends_count'), 'possibly_sensitive': ('possibly_sensitive',),
+        'hashtags': Joined(('entities', 'hashtags'), 'text'), 'retweet_hashtags': _v1_retweet_hashtags,
+        'user_mentions': Joined(('entities', 'user_mentions'), 'screen_name'), 'place': ('user', 'location'),
+        'tweet_url': _v1_url, 'tweet_id': _tweet_id, 'tweet_category': _v1_category,
+        'statuses_count': ('user', 'statuses_count'),
+    },
+}
+
+
+def detect_schema(tweets) -> str:
+    """
+    payload schema of a batch of tweets, decided on its first tweet: 'v1.1' when it has a user
+    object or a full_text, 'v2' otherwise (and for an empty batch)
+    """
+    for tweet in tweets:
+        return 'v1.1' if 'user' in tweet or 'full_text' in tweet else 'v2'
+    return 'v2'
+
+
+def _path_getter(path: tuple, default):
+    """function reading the field at path of a tweet, a missing or null parent reads as an empty dict"""
+    parents, key = path[:-1], path[-1]
+
+    def get(tweet):
+        for parent in parents:
+            tweet = tweet.get(parent) or _EMPTY
+        return tweet.get(key, default)
+
+    return get
+
+
+def _joined_getter(field: Joined):
+    """function joining the items of a Joined list field of a tweet"""
+    get_items = _path_getter(field.path, None)
+    return lambda tweet: _join(get_items(tweet), field.item_key)
+
+
+class CompiledSchema:
+    """
+    field accessors of one payload schema, built once from SCHEMA_FIELDS. Paths become chains of
+    dict.get (a missing or null parent reads as an empty dict), so missing fields cost no KeyError.
+    extract() goes column by column and looks up every shared parent (author, public_metrics, ...)
+    once per tweet, for all the columns below it.
+
+    Arguments:
+    -----------
+
+    schema= 'v2' or 'v1.1'
+
+    Returns:
+    --------
+    An object with an accessor per column (accessors) and extract(tweets)
+    """
+
+    def __init__(self, schema: str):
+        if schema not in SCHEMA_FIELDS:
+            raise ValueError('unknown tweet schema {!r}'.format(schema))
+        self.schema = schema
+        self.fields = SCHEMA_FIELDS[schema]
+        self.accessors = {col: self._accessor(col) for col in self.fields}
+
+    def _accessor(self, col: str):
+        """function of a tweet returning the value of col"""
+        field = self.fields[col]
+        if callable(field):
+            return field
+        if isinstance(field, Joined):
+            return _joined_getter(field)
+        return _path_getter(field, COLUMN_DEFAULTS.get(col, np.nan))
+
+    def extract(self, tweets: list, columns: list = RAW_COLUMNS) -> dict:
+        """
+        single pass extractor of columns: the parents of every path are resolved once per tweet into
+        one list per parent, every column is then one comprehension over its parent's list
+
+        Returns
+        -------
+        A dict of column -> list of values, in the order of tweets
+        """
+        parents = {(): tweets}
+
+        def parent_values(path: tuple) -> list:
+            if path not in parents:
+                key = path[-1]
+                parents[path] = [parent.get(key) or _EMPTY for parent in parent_values(path[:-1])]
+            return parents[path]
+
+        columns_values = {}
+        for col in columns:
+            field = self.fields[col]
+            if callable(field):
+                columns_values[col] = list(map(field, tweets))
+            elif isinstance(field, Joined):
+                key, item_key = field.path[-1], field.item_key
+                columns_values[col] = [_join(parent.get(key), item_key) for parent in parent_values(field.path[:-1])]
+            else:
+                key, default = field[-1], COLUMN_DEFAULTS.get(col, np.nan)
+                columns_values[col] = [parent.get(key, default) for parent in parent_values(field[:-1])]
+        return columns_values
+
+
+SCHEMAS = {schema: CompiledSchema(schema) for schema in SCHEMA_FIELDS}
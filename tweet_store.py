@@ -0,0 +1,310 @@
+import argparse
+import glob
+import os
+import sqlite3
+import time
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from sentiment_cache import select_in
+
+# low cardinality columns, stored dictionary encoded and read back as pandas categoricals
+CATEGORY_COLUMNS = ['lang', 'sentiment', 'tweet_category', 'source']
+# suffix of part files being written, renamed to their final name once their append is committed
+TEMP_SUFFIX = '.tmp'
+# age after which an uncommitted temp part is taken to be left by a crashed append, not one in flight
+STALE_TEMP_SECONDS = 3600
+
+
+def to_store_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    prepare a tweet dataframe for the parquet store: lang/sentiment/tweet_category/source become
+    categoricals, which pyarrow writes dictionary encoded
+    """
+    df = df.copy()
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
+
+def write_tweets(df: pd.DataFrame, path: str):
+    """
+    write a tweet dataframe to a parquet file
+    """
+    to_store_frame(df).to_parquet(path, engine='pyarrow')
+
+
+def entities_path(path: str) -> str:
+    """path of the hashtag/mention table stored next to a tweet parquet file"""
+    return os.path.splitext(path)[0] + '_entities.parquet'
+
+
+def write_entities(entity_df: pd.DataFrame, path: str):
+    """
+    write the exploded hashtag/mention table (TweetDfExtractor.build_entity_df) to a parquet file
+    """
+    entity_df.to_parquet(path, engine='pyarrow', index=False)
+
+
+def chunk_schema(table: pa.Table) -> pa.Schema:
+    """
+    schema of every chunk of write_tweet_chunks, from the first one: categories differ between
+    chunks, so every dictionary column gets int32 indices, and a column that is empty in the first
+    chunk (pyarrow null type, or a categorical without categories) is taken to hold strings
+    """
+    fields = []
+    for field, column in zip(table.schema, table.columns):
+        if pa.types.is_null(field.type):
+            field = field.with_type(pa.string())
+        elif pa.types.is_dictionary(field.type):
+            value_type = field.type.value_type
+            if all(len(chunk.dictionary) == 0 for chunk in column.chunks):
+                value_type = pa.string()
+            field = field.with_type(pa.dictionary(pa.int32(), value_type))
+        fields.append(field)
+    return pa.schema(fields, metadata=table.schema.metadata)
+
+
+class ParquetChunkWriter:
+    """
+    a parquet file written one dataframe chunk (row group) at a time, so the whole table never has
+    to be held in memory. The file is created on the first chunk, with chunk_schema of that chunk.
+
+    Arguments:
+    -----------
+
+    path= parquet file to write
+    store_frame= prepare every chunk with to_store_frame (tweet dataframes)
+
+    Returns:
+    --------
+    A writer with write/close, usable as a context manager
+    """
+
+    def __init__(self, path: str, store_frame: bool = True):
+        self.path = path
+        self.store_frame = store_frame
+        self.writer = None
+        self.schema = None
+        self.n_rows = 0
+
+    def write(self, df: pd.DataFrame) -> int:
+        """append a dataframe as one row group, returns its number of rows"""
+        if self.store_frame:
+            df = to_store_frame(df)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self.writer is None:
+            self.schema = chunk_schema(table)
+            self.writer = pq.ParquetWriter(self.path, self.schema)
+        self.writer.write_table(table.cast(self.schema))
+        self.n_rows += table.num_rows
+        return table.num_rows
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_tweet_chunks(tweet_dfs, path: str) -> int:
+    """
+    write dataframe chunks one row group at a time into a single parquet file, so the whole
+    corpus never has to be held in memory
+
+    Returns
+    -------
+    The number of rows written
+    """
+    with ParquetChunkWriter(path) as writer:
+        for df in tweet_dfs:
+            writer.write(df)
+    return writer.n_rows
+
+
+def read_tweets(path: str, columns: list = None) -> pd.DataFrame:
+    """
+    read a tweet dataframe from a parquet file, optionally only some of its columns
+    """
+    return pd.read_parquet(path, engine='pyarrow', columns=columns)
+
+
+class PartitionedTweetStore:
+    """
+    append-only tweet store partitioned by created_at day, for incremental extraction runs.
+    Every append writes new part files under <root>/day=YYYY-MM-DD/ (tweets without a date go to
+    day=unknown) and never rewrites existing ones. The tweet_id of every stored tweet is kept in
+    an SQLite index, <root>/seen_ids.sqlite, so a new run only has to process unseen tweets.
+    The same file lists the committed part files: an append writes its parts under a temporary
+    name, records its ids and its parts in one transaction and only then renames the parts, so
+    readers and other processes never see a part that is not committed. On open, committed parts
+    still under their temporary name are renamed and stale uncommitted ones are removed.
+
+    Arguments:
+    -----------
+
+    root= directory of the store, created if missing
+
+    Returns:
+    --------
+    A store with unseen/append/read
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(root, 'seen_ids.sqlite'))
+        self.conn.execute("CREATE TABLE IF NOT EXISTS seen_ids (tweet_id TEXT PRIMARY KEY, day TEXT)")
+        has_parts = self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'parts'").fetchone() is not None
+        self.conn.execute("CREATE TABLE IF NOT EXISTS parts (path TEXT PRIMARY KEY, day TEXT)")
+        part_files = self._part_files()
+        if not has_parts:
+            # a store written before the parts table: its ids were committed after its parts
+            self.conn.executemany("INSERT INTO parts VALUES (?, ?)", part_files.items())
+        self.conn.commit()
+        committed = {path for path, in self.conn.execute("SELECT path FROM parts")}
+        committed |= {entities_path(path) for path in committed}
+        for temp_path in glob.glob(os.path.join(root, 'day=*', '*' + TEMP_SUFFIX)):
+            final_path = temp_path[:-len(TEMP_SUFFIX)]
+            if os.path.relpath(final_path, root) in committed:
+                # its append crashed between the commit and the rename
+                self._publish(final_path)
+            elif time.time() - os.path.getmtime(temp_path) > STALE_TEMP_SECONDS:
+                os.remove(temp_path)
+
+    @staticmethod
+    def _publish(path: str):
+        """give the temporary file of path its final name, unless another process already did"""
+        try:
+            os.replace(path + TEMP_SUFFIX, path)
+        except FileNotFoundError:
+            pass
+
+    def _part_files(self) -> dict:
+        """the tweet part files on disk, path relative to root -> day"""
+        part_paths = glob.glob(os.path.join(self.root, 'day=*', '*.parquet'))
+        return {os.path.relpath(path, self.root): os.path.basename(os.path.dirname(path))[len('day='):]
+                for path in part_paths if not path.endswith('_entities.parquet')}
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM seen_ids").fetchone()[0]
+
+    def seen(self, tweet_ids) -> set:
+        """the ids of tweet_ids that are already stored"""
+        tweet_ids = list({str(tweet_id) for tweet_id in tweet_ids})
+        return {tweet_id for tweet_id, in select_in(self.conn, "SELECT tweet_id FROM seen_ids WHERE tweet_id IN ({})",
+                                                    tweet_ids)}
+
+    def unseen(self, tweets: list) -> list:
+        """
+        the raw tweets (read_json dicts) that are not stored yet, each id kept once. Tweets without
+        an id cannot be tracked and are left out.
+        """
+        tweets = [tweet for tweet in tweets if 'id' in tweet]
+        seen = self.seen(tweet['id'] for tweet in tweets)
+        new_tweets = []
+        for tweet in tweets:
+            tweet_id = str(tweet['id'])
+            if tweet_id not in seen:
+                seen.add(tweet_id)
+                new_tweets.append(tweet)
+        return new_tweets
+
+    def append(self, df: pd.DataFrame, entity_df: pd.DataFrame = None) -> int:
+        """
+        write the tweets of df as one new part file per created_at day, with their hashtag/mention
+        rows of entity_df next to it, then commit the parts and record their ids as seen in one
+        transaction, and rename the parts from their temporary name. Until the commit the new parts
+        are not part of the store, so a run that crashes before it processes the same tweets again
+        instead of storing them twice.
+
+        Returns
+        -------
+        The number of part files written
+        """
+        if df.empty:
+            return 0
+        days = pd.to_datetime(df['created_at'], errors='coerce', utc=True).dt.strftime('%Y-%m-%d').fillna('unknown')
+        part_name = 'part-{}-{}.parquet'.format(time.strftime('%Y%m%dT%H%M%S'), uuid.uuid4().hex[:8])
+        parts = []
+        for day, df_day in df.groupby(days.values, sort=True):
+            os.makedirs(os.path.join(self.root, 'day={}'.format(day)), exist_ok=True)
+            path = os.path.join('day={}'.format(day), part_name)
+            part_path = os.path.join(self.root, path)
+            write_tweets(df_day, part_path + TEMP_SUFFIX)
+            if entity_df is not None:
+                write_entities(entity_df[entity_df['tweet_id'].isin(df_day['tweet_id'])],
+                               entities_path(part_path) + TEMP_SUFFIX)
+            parts.append((path, day))
+
+        with self.conn:
+            self.conn.executemany("INSERT INTO parts VALUES (?, ?)", parts)
+            self.conn.executemany("INSERT OR IGNORE INTO seen_ids VALUES (?, ?)",
+                                  zip(df['tweet_id'].astype(str), days))
+        for path, day in parts:
+            part_path = os.path.join(self.root, path)
+            self._publish(part_path)
+            if entity_df is not None:
+                self._publish(entities_path(part_path))
+        return len(parts)
+
+    def days(self) -> list:
+        """the stored days, oldest first"""
+        return [day for day, in self.conn.execute("SELECT DISTINCT day FROM parts ORDER BY day")]
+
+    def read(self, days: list = None, columns: list = None) -> pd.DataFrame:
+        """
+        read the tweets of some days (every day by default), optionally only some of their columns
+        """
+        days = self.days() if days is None else days
+        part_paths = [os.path.join(self.root, path) for path, day in
+                      self.conn.execute("SELECT path, day FROM parts ORDER BY day, path") if day in days]
+        if not part_paths:
+            return pd.DataFrame(columns=columns)
+        df = pd.concat([read_tweets(path, columns=columns) for path in part_paths], ignore_index=True)
+        # parts have their own categories, concat leaves those columns as object
+        for col in CATEGORY_COLUMNS:
+            if col in df.columns:
+                df[col] = df[col].astype('category')
+        return df
+
+    def close(self):
+        self.conn.close()
+
+
+def convert_excel(xlsx_path: str, parquet_path: str = None) -> str:
+    """
+    convert one of the processed .xlsx exports to the parquet store. The dataframe index
+    written by to_excel (an unnamed first column) is kept as the index.
+
+    Returns
+    -------
+    The path of the parquet file
+    """
+    if parquet_path is None:
+        parquet_path = os.path.splitext(xlsx_path)[0] + '.parquet'
+
+    df = pd.read_excel(xlsx_path, engine='openpyxl', dtype={'tweet_id': 'str'})
+    if str(df.columns[0]).startswith('Unnamed: 0'):
+        df = df.set_index(df.columns[0])
+        df.index.name = None
+    write_tweets(df, parquet_path)
+    return parquet_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='convert processed tweet .xlsx files to parquet')
+    parser.add_argument('xlsx_files', nargs='+')
+    args = parser.parse_args()
+
+    for xlsx_file in args.xlsx_files:
+        print('{} -> {}'.format(xlsx_file, convert_excel(xlsx_file)))
@@ -0,0 +1,59 @@
+import re
+
+import pandas as pd
+
+# a word: letters, with inner apostrophes ("don't"), digits and underscores split words
+WORD_RE = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)*")
+# keys of the word count table, next to word and count
+WORD_KEYS = ['sentiment', 'lang', 'tweet_category']
+
+# wordcloud's english STOPWORDS and the extra (mostly french) words of analysis.ipynb, lower case
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are aren't as at be because been before being below
+between both but by can can't cannot com could couldn't did didn't do does doesn't doing don't down during each
+else ever few for from further get had hadn't has hasn't have haven't having he he'd he'll he's hence her here
+here's hers herself him himself his how how's however http https i i'd i'll i'm i've if in into is isn't it it's
+its itself just k let's like me more most mustn't my myself no nor not of off on once only or other otherwise
+ought our ours ourselves out over own r same shall shan't she she'd she'll she's should shouldn't since so some
+such than that that's the their theirs them themselves then there there's therefore these they they'd they'll
+they're they've this those through to too under until up very was wasn't we we'd we'll we're we've were weren't
+what what's when when's where where's which while who who's whom why why's with won't would wouldn't www you
+you'd you'll you're you've your yours yourself yourselves amp rt co will el del lo
+au aux avec ce ces cette dans de des du elle en est et eux il ils je la le les leur lui ma mais me mes moi mon
+ne nos notre nous on ou par pas pour qu que qui sa se ses son sur ta te tes toi ton tu un une vos votre vous
+""".split())
+
+
+def build_word_counts(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    count the words of the cleaned_text of every tweet per (sentiment, lang, tweet_category), the
+    table word clouds are drawn from. Words are lower cased, stop words and one letter words are
+    left out.
+
+    Returns
+    -------
+    A dataframe with sentiment, lang, tweet_category, word (categorical) and count columns
+    """
+    words = df['cleaned_text'].str.lower().str.findall(WORD_RE)
+    df_words = df[WORD_KEYS].assign(word=words).explode('word', ignore_index=True)
+    df_words = df_words[df_words['word'].str.len().gt(1) & ~df_words['word'].isin(STOPWORDS)]
+    counts = df_words.groupby(WORD_KEYS + ['word'], observed=True, dropna=False).size().reset_index(name='count')
+    return counts.astype({key: 'category' for key in WORD_KEYS + ['word']})
+
+
+def word_frequencies(counts: pd.DataFrame, sent_sel=None, lang_sel=None, categories=None,
+                     max_words: int = 200) -> dict:
+    """
+    add up the word counts of the selected sentiments, languages and tweet categories (every one
+    when None) without going back to the texts
+
+    Returns
+    -------
+    A dict of the max_words most frequent words -> count
+    """
+    mask = pd.Series(True, index=counts.index)
+    for key, sel in zip(WORD_KEYS, [sent_sel, lang_sel, categories]):
+        if sel is not None:
+            mask &= counts[key].isin(sel)
+    totals = counts.loc[mask].groupby('word', observed=True)['count'].sum()
+    return totals.nlargest(max_words).to_dict()